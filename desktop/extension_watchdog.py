@@ -16,10 +16,11 @@ import json
 import os
 import sys
 import time
-import subprocess
 from pathlib import Path
 from datetime import datetime
 
+from notifier import get_notifier
+
 # Chrome storage location (varies by platform)
 CHROME_STORAGE_PATHS = [
     # Linux
@@ -88,17 +89,8 @@ def write_desktop_heartbeat():
 
 
 def show_alert(title, message):
-    """Show desktop notification"""
-    try:
-        subprocess.run([
-            'notify-send',
-            '-u', 'critical',
-            '-a', 'TotalControl Watchdog',
-            title,
-            message
-        ], timeout=5)
-    except:
-        print(f"ALERT: {title} - {message}")
+    """Queue desktop notification (sent in the background, rate-limited)"""
+    get_notifier("TotalControl Watchdog").notify(title, message, 'critical', 'extension')
 
 
 def on_extension_dead():
@@ -0,0 +1,220 @@
+"""
+TotalControl Notifier
+
+Desktop notifications sent from a background thread, so a slow notification
+daemon never stalls the monitors:
+- a message identical to the last one shown for its source, within
+  COALESCE_WINDOW seconds, is dropped
+- each source (an app, the watchdog) has a token bucket of RATE_BURST
+  notifications refilled one per RATE_INTERVAL; while it is empty only the
+  source's latest message waits, replacing older unsent ones
+- at most QUEUE_SIZE sources wait at once, further ones are dropped
+
+Notifications go straight to org.freedesktop.Notifications over one
+persistent session bus connection when dbus-python is installed (a newer
+notification from a source replaces its previous one on screen), through
+notify-send otherwise.
+"""
+
+import atexit
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+QUEUE_SIZE = 32          # Sources with a notification waiting
+COALESCE_WINDOW = 30.0   # Seconds an identical message from a source is suppressed
+RATE_BURST = 3           # Notifications a source may send back to back
+RATE_INTERVAL = 10.0     # Seconds to earn one more
+SEND_TIMEOUT = 5         # Seconds for notify-send
+EXPIRE_MS = -1           # Server default display time
+
+_URGENCY = {'low': 0, 'normal': 1, 'critical': 2}
+
+
+@dataclass
+class Notification:
+    source: str
+    title: str
+    message: str
+    urgency: str
+    waited: bool = False  # Had to wait for its source's rate limit
+
+
+class _Bucket:
+    """Token bucket for one source"""
+
+    def __init__(self, now: float):
+        self.tokens = float(RATE_BURST)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        """When a token is available (now or later)"""
+        self.tokens = min(RATE_BURST, self.tokens + (now - self.updated) / RATE_INTERVAL)
+        self.updated = now
+        return now if self.tokens >= 1 else now + (1 - self.tokens) * RATE_INTERVAL
+
+
+class Notifier:
+    """Bounded, coalescing, rate-limited notification queue with a sender thread"""
+
+    def __init__(self, app_name: str = "TotalControl", use_dbus: bool = True):
+        self.app_name = app_name
+        self.use_dbus = use_dbus
+        self.sent = 0
+        self.coalesced = 0
+        self.rate_limited = 0   # Waited for a token (possibly replaced meanwhile)
+        self.dropped = 0
+        self._pending = OrderedDict()  # source -> Notification
+        self._shown = {}               # source -> (title, message, time) last shown
+        self._buckets = {}             # source -> _Bucket
+        self._ids = {}                 # source -> notification id to replace (D-Bus)
+        self._cond = threading.Condition()
+        self._sending = False
+        self._running = False
+        self._dbus = None
+
+    def notify(self, title: str, message: str, urgency: str = "critical", source: str = "default") -> bool:
+        """Queue a notification without blocking; False if it was coalesced or dropped"""
+        now = time.monotonic()
+        with self._cond:
+            shown = self._shown.get(source)
+            waiting = self._pending.get(source)
+            # Compare with what will be on screen last: the waiting message if any
+            if waiting is not None:
+                duplicate = (waiting.title, waiting.message) == (title, message)
+            else:
+                duplicate = shown is not None and shown[:2] == (title, message) and now - shown[2] < COALESCE_WINDOW
+            if duplicate:
+                self.coalesced += 1
+                return False
+            if waiting is not None:
+                self.coalesced += 1  # Superseded before it was shown
+                if shown is not None and shown[:2] == (title, message):
+                    del self._pending[source]  # Back to what is on screen
+                    return False
+            elif len(self._pending) >= QUEUE_SIZE:
+                self.dropped += 1
+                return False
+            self._pending[source] = Notification(source, title, message, urgency)
+            self._cond.notify()
+        self.start()
+        return True
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        threading.Thread(target=self._loop, daemon=True, name="notifier").start()
+
+    def close(self, timeout: float = 2.0):
+        """Give queued notifications up to timeout seconds, then stop the sender"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._pending or self._sending) and self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._running = False
+            self._cond.notify_all()
+
+    def _next(self) -> Optional[Notification]:
+        """Wait for a notification whose source has a token; None once stopped"""
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                wake = None
+                for source, notification in self._pending.items():
+                    bucket = self._buckets.setdefault(source, _Bucket(now))
+                    ready = bucket.ready_at(now)
+                    if ready <= now:
+                        bucket.tokens -= 1
+                        del self._pending[source]
+                        self._shown[source] = (notification.title, notification.message, now)
+                        self._sending = True
+                        return notification
+                    if not notification.waited:
+                        notification.waited = True
+                        self.rate_limited += 1
+                    wake = ready if wake is None else min(wake, ready)
+                self._cond.wait(None if wake is None else wake - now)
+            return None
+
+    def _loop(self):
+        while True:
+            notification = self._next()
+            if notification is None:
+                break
+            try:
+                self._send(notification)
+            except Exception as e:
+                print(f"[Notify] {e}", file=sys.stderr)
+            with self._cond:
+                self._sending = False
+                self.sent += 1
+                self._cond.notify_all()
+
+    def _send(self, notification: Notification):
+        if self._send_dbus(notification):
+            return
+        try:
+            subprocess.run([
+                'notify-send',
+                '-u', notification.urgency,
+                '-a', self.app_name,
+                notification.title,
+                notification.message
+            ], timeout=SEND_TIMEOUT)
+        except Exception:
+            print(f"ALERT: {notification.title} - {notification.message}")
+
+    def _connect_dbus(self):
+        import dbus
+        bus = dbus.SessionBus()
+        proxy = bus.get_object('org.freedesktop.Notifications', '/org/freedesktop/Notifications')
+        return dbus, dbus.Interface(proxy, 'org.freedesktop.Notifications')
+
+    def _send_dbus(self, notification: Notification) -> bool:
+        """Notify over the session bus; False if D-Bus isn't available"""
+        if not self.use_dbus:
+            return False
+        try:
+            if self._dbus is None:
+                self._dbus = self._connect_dbus()
+            dbus, notifications = self._dbus
+            self._ids[notification.source] = int(notifications.Notify(
+                self.app_name,
+                dbus.UInt32(self._ids.get(notification.source, 0)),
+                '',
+                notification.title,
+                notification.message,
+                dbus.Array([], signature='s'),
+                {'urgency': dbus.Byte(_URGENCY.get(notification.urgency, 1))},
+                dbus.Int32(EXPIRE_MS)))
+            return True
+        except ImportError:
+            self.use_dbus = False
+        except Exception as e:
+            # Bus or notification daemon gone: reconnect next time
+            print(f"[Notify] D-Bus: {e}", file=sys.stderr)
+            self._dbus = None
+        return False
+
+    def summary(self) -> str:
+        return (f"{self.sent} sent, {self.coalesced} coalesced, "
+                f"{self.rate_limited} rate-limited, {self.dropped} dropped")
+
+
+_notifier = None
+
+def get_notifier(app_name: str = "TotalControl") -> Notifier:
+    global _notifier
+    if _notifier is None:
+        _notifier = Notifier(app_name)
+        atexit.register(_notifier.close)
+    return _notifier
@@ -9,18 +9,39 @@ Discord window titles:
 - DM: "@username - Discord" or "Discord"
 - Server: "#channel-name - Server Name - Discord"
 
+Focus changes come from X11 PropertyNotify events (python-xlib) when
+available, polling xdotool/xprop otherwise.
+
+The "desktop" section of ~/.totalcontrol/patterns.json (see
+ocr/config_watch.py) overrides APP_PATTERNS, ALLOWED_APPS and BLOCKED_APPS
+and is reloaded while the monitor runs.
+
 Usage:
-    python window_monitor.py [--daemon]
+    python window_monitor.py [--daemon] [--poll]
+    python window_monitor.py --test
+    python window_monitor.py --replay titles.tsv   # wm_class<TAB>title per line
 """
 
 import subprocess
 import re
+import select
 import time
 import sys
 import os
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional, Tuple
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from notifier import get_notifier
+
+# The config watcher is shared with the OCR monitor
+sys.path.append(str(Path(__file__).resolve().parent.parent / "ocr"))
+try:
+    from config_watch import ConfigError, ConfigWatcher, check_object, check_strings, section
+except ImportError:
+    ConfigWatcher = None
 
 class ScreenType(Enum):
     DM = "dm"
@@ -37,6 +58,14 @@ class WindowInfo:
     wm_class: str
     title: str
 
+@dataclass
+class WindowMeta:
+    """Attributes that don't change for the life of a window"""
+    pid: int
+    wm_class: str
+    app: Optional[tuple] = None  # resolve_app(wm_class), filled on first use
+    rules: Optional['TitleRules'] = None  # Rules app was resolved with
+
 @dataclass
 class BlockDecision:
     should_block: bool
@@ -103,6 +132,57 @@ BLOCKED_APPS = {
     'tiktok',
 }
 
+CONFIG_FILE = Path.home() / ".totalcontrol" / "patterns.json"
+
+WINDOW_CACHE_SIZE = 256
+APP_CACHE_SIZE = 1024
+SCREEN_TYPE_MEMO_SIZE = 4096
+
+
+class LRUCache:
+    """Bounded mapping, least recently used entry dropped first, with hit counters"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+# WindowMeta by window id. Entries are invalidated when the window is destroyed
+# (X11 DestroyNotify) or, when polling, once the owning process is gone - X
+# only reuses an id after its window was destroyed.
+window_cache = LRUCache(WINDOW_CACHE_SIZE)
+
 
 def get_active_window() -> Optional[WindowInfo]:
     """Get currently focused window info using xdotool and xprop"""
@@ -124,6 +204,12 @@ def get_active_window() -> Optional[WindowInfo]:
         )
         title = result.stdout.strip() if result.returncode == 0 else ""
 
+        # PID and class never change for a window: only query new windows
+        meta = window_cache.get(window_id)
+        if meta is not None and os.path.exists(f"/proc/{meta.pid}"):
+            return WindowInfo(window_id=window_id, pid=meta.pid, wm_class=meta.wm_class, title=title)
+        window_cache.invalidate(window_id)
+
         # Get window PID
         result = subprocess.run(
             ['xdotool', 'getwindowpid', window_id],
@@ -143,6 +229,10 @@ def get_active_window() -> Optional[WindowInfo]:
             if match:
                 wm_class = match.group(1)
 
+        # Without a PID there is no way to notice the id being reused
+        if pid:
+            window_cache.put(window_id, WindowMeta(pid, wm_class))
+
         return WindowInfo(
             window_id=window_id,
             pid=pid,
@@ -154,42 +244,262 @@ def get_active_window() -> Optional[WindowInfo]:
         return None
 
 
-def detect_screen_type(window: WindowInfo) -> Tuple[str, ScreenType]:
-    """Detect app and screen type from window info"""
-    wm_class_lower = window.wm_class.lower()
-    title = window.title
-
-    # Check always-allowed apps
-    for allowed in ALLOWED_APPS:
-        if allowed.lower() in wm_class_lower:
-            return allowed, ScreenType.ALLOWED
-
-    # Check always-blocked apps
-    for blocked in BLOCKED_APPS:
-        if blocked.lower() in wm_class_lower:
-            return blocked, ScreenType.FEED
+class FocusTracker:
+    """
+    One persistent X connection watching _NET_ACTIVE_WINDOW on the root window
+    and the title (_NET_WM_NAME / WM_NAME) of the focused window. Needs
+    python-xlib and an EWMH window manager.
+    """
+
+    def __init__(self):
+        from Xlib import X, display, error
+
+        self._X = X
+        self._XError = error.XError
+        self._display = display.Display()
+        # Windows can vanish between an event and our requests about them
+        self._display.set_error_handler(lambda *args: None)
+        self._root = self._display.screen().root
+        self._atoms = {name: self._display.intern_atom(name) for name in
+                       ('_NET_ACTIVE_WINDOW', '_NET_WM_NAME', 'WM_NAME', '_NET_WM_PID', 'UTF8_STRING')}
+        self._root.change_attributes(event_mask=X.PropertyChangeMask)
+        self._focused = None
+        self._last = None
+
+    def _property(self, window, name: str, type_=0):
+        prop = window.get_full_property(self._atoms[name], type_ or self._X.AnyPropertyType)
+        return prop.value if prop is not None else None
+
+    def _watch(self, window_id: int):
+        """Follow title changes of the newly focused window only, destruction of every cached one"""
+        X = self._X
+        if self._focused is not None and self._focused.id != window_id:
+            cached = str(self._focused.id) in window_cache
+            self._focused.change_attributes(event_mask=X.StructureNotifyMask if cached else X.NoEventMask)
+        self._focused = None
+        if window_id:
+            self._focused = self._display.create_resource_object('window', window_id)
+            self._focused.change_attributes(event_mask=X.PropertyChangeMask | X.StructureNotifyMask)
+        self._display.flush()
+
+    def current(self) -> Optional[WindowInfo]:
+        """Focused window, read over the X connection"""
+        try:
+            active = self._property(self._root, '_NET_ACTIVE_WINDOW')
+            window_id = int(active[0]) if active else 0
+            if self._focused is None or self._focused.id != window_id:
+                self._watch(window_id)
+            if not window_id:
+                return None
+            window = self._focused
+
+            title = self._property(window, '_NET_WM_NAME', self._atoms['UTF8_STRING'])
+            if title is None:
+                title = self._property(window, 'WM_NAME')
+            if isinstance(title, bytes):
+                title = title.decode('utf-8', 'replace')
+
+            meta = window_cache.get(str(window_id))
+            if meta is None:
+                pid = self._property(window, '_NET_WM_PID')
+                wm_class = window.get_wm_class()
+                meta = WindowMeta(int(pid[0]) if pid else 0, wm_class[0] if wm_class else "")
+                window_cache.put(str(window_id), meta)
+
+            return WindowInfo(
+                window_id=str(window_id),
+                pid=meta.pid,
+                wm_class=meta.wm_class,
+                title=title or ""
+            )
+        except self._XError:
+            return None
 
-    # Check known apps with DM detection
-    for app_name, patterns in APP_PATTERNS.items():
-        # Check if WM_CLASS matches
-        if not any(wc.lower() in wm_class_lower for wc in patterns['wm_class']):
-            continue
+    def changes(self) -> Iterator[WindowInfo]:
+        """Yield the focused window now and whenever focus or its title changes"""
+        relevant = {self._atoms[name] for name in ('_NET_ACTIVE_WINDOW', '_NET_WM_NAME', 'WM_NAME')}
+        fd = self._display.fileno()
+        while True:
+            window = self.current()
+            key = (window.window_id, window.title) if window else None
+            if window is not None and key != self._last:
+                self._last = key
+                yield window
+
+            # Sleep until the X server has something for us
+            changed = False
+            while not changed:
+                if not self._display.pending_events():
+                    select.select([fd], [], [])
+                while self._display.pending_events():
+                    event = self._display.next_event()
+                    if event.type == self._X.PropertyNotify and event.atom in relevant:
+                        changed = True
+                    elif event.type == self._X.DestroyNotify:
+                        window_cache.invalidate(str(event.window.id))
+
+    def close(self):
+        self._display.close()
+
+
+def poll_changes(interval: float) -> Iterator[WindowInfo]:
+    """Subprocess fallback: yield the focused window every interval"""
+    while True:
+        window = get_active_window()
+        if window is not None:
+            yield window
+        time.sleep(interval)
 
-        # Check DM patterns first (higher priority)
-        for pattern in patterns.get('dm_patterns', []):
-            if re.search(pattern, title, re.IGNORECASE):
-                return app_name, ScreenType.DM
 
-        # Check server/feed patterns
-        for pattern in patterns.get('server_patterns', []):
-            if re.search(pattern, title, re.IGNORECASE):
-                return app_name, ScreenType.SERVER_CHANNEL
+def window_changes(interval: float, use_events: bool = True) -> Iterator[WindowInfo]:
+    """Focused window changes from X11 events, or from polling if those aren't available"""
+    if use_events:
+        try:
+            tracker = FocusTracker()
+        except ImportError:
+            print("python-xlib not installed - polling the focused window", file=sys.stderr)
+        except Exception as e:
+            print(f"X11 focus events unavailable ({e}) - polling the focused window", file=sys.stderr)
+        else:
+            try:
+                yield from tracker.changes()
+            finally:
+                tracker.close()
+            return
+    yield from poll_changes(interval)
+
+
+def compile_title_patterns(app_patterns: dict) -> dict:
+    """
+    One regex per app in app_patterns. Anchored at the start of the title, it
+    first looks ahead for any DM pattern, then for any server pattern, so DM
+    patterns keep priority wherever they match; the named group that took
+    part says which kind matched.
+    """
+    compiled = {}
+    for app_name, patterns in app_patterns.items():
+        branches = []
+        for kind in ('dm', 'server'):
+            alternatives = '|'.join(f'(?:{p})' for p in patterns.get(f'{kind}_patterns', []))
+            if alternatives:
+                branches.append(f'(?=(?s:.*?)(?:{alternatives}))(?P<{kind}>)')
+        if branches:
+            compiled[app_name] = re.compile('|'.join(branches), re.IGNORECASE)
+    return compiled
+
+
+class TitleRules:
+    """
+    App tables with their compiled title patterns and memos. The tables are
+    never changed after construction: a config reload builds new rules (on
+    the watcher thread) and replaces title_rules in one assignment, so a
+    lookup sees either the old rules or the new ones.
+    """
+
+    def __init__(self, app_patterns: dict, allowed_apps, blocked_apps):
+        self.app_patterns = app_patterns
+        self.allowed_apps = tuple(allowed_apps)
+        self.blocked_apps = tuple(blocked_apps)
+        self.title_patterns = compile_title_patterns(app_patterns)  # Raises re.error
+        self.apps = LRUCache(APP_CACHE_SIZE)
+        # (wm_class, title) -> (app name, ScreenType)
+        self.memo = LRUCache(SCREEN_TYPE_MEMO_SIZE)
+
+    def resolve_app(self, wm_class: str) -> tuple:
+        """
+        (app name, fixed screen type) for a WM_CLASS. The screen type is None for
+        apps in app_patterns, whose screen depends on the title.
+        """
+        result = self.apps.get(wm_class)
+        if result is None:
+            result = self._resolve_app(wm_class)
+            self.apps.put(wm_class, result)
+        return result
+
+    def _resolve_app(self, wm_class: str) -> tuple:
+        wm_class_lower = wm_class.lower()
+
+        # Check always-allowed apps
+        for allowed in self.allowed_apps:
+            if allowed.lower() in wm_class_lower:
+                return allowed, ScreenType.ALLOWED
+
+        # Check always-blocked apps
+        for blocked in self.blocked_apps:
+            if blocked.lower() in wm_class_lower:
+                return blocked, ScreenType.FEED
+
+        # Check known apps with DM detection
+        for app_name, patterns in self.app_patterns.items():
+            if any(wc.lower() in wm_class_lower for wc in patterns.get('wm_class', [])):
+                return app_name, None
+
+        # Unknown app - allow
+        return "unknown", ScreenType.ALLOWED
+
+
+title_rules = TitleRules(APP_PATTERNS, ALLOWED_APPS, BLOCKED_APPS)
+
+_TITLE_SCREEN_TYPES = {'dm': ScreenType.DM, 'server': ScreenType.SERVER_CHANNEL}
+
+
+def resolve_app(wm_class: str) -> tuple:
+    return title_rules.resolve_app(wm_class)
+
+
+def _window_app(window: WindowInfo, rules: TitleRules) -> tuple:
+    """rules.resolve_app for the window, computed once per cached window and rules"""
+    meta = window_cache.get(window.window_id)
+    if meta is None or meta.wm_class != window.wm_class:
+        return rules.resolve_app(window.wm_class)
+    if meta.rules is not rules:
+        meta.app, meta.rules = rules.resolve_app(meta.wm_class), rules
+    return meta.app
 
-        # App matched but no specific pattern - default to unknown
-        return app_name, ScreenType.UNKNOWN
 
-    # Unknown app - allow
-    return "unknown", ScreenType.ALLOWED
+def detect_screen_type(window: WindowInfo) -> Tuple[str, ScreenType]:
+    """Detect app and screen type from window info"""
+    rules = title_rules
+    key = (window.wm_class, window.title)
+    result = rules.memo.get(key)
+    if result is not None:
+        return result
+
+    app_name, screen_type = _window_app(window, rules)
+    if screen_type is None:
+        # DM patterns first (higher priority), then server/feed patterns;
+        # app matched but no specific pattern - default to unknown
+        pattern = rules.title_patterns.get(app_name)
+        match = pattern.match(window.title) if pattern else None
+        screen_type = _TITLE_SCREEN_TYPES[match.lastgroup] if match else ScreenType.UNKNOWN
+
+    result = (app_name, screen_type)
+    rules.memo.put(key, result)
+    return result
+
+
+_APP_PATTERN_KEYS = ('wm_class', 'dm_patterns', 'server_patterns')
+
+
+def apply_window_config(config: dict):
+    """Build rules from the config's 'desktop' section and swap them in; raises if it is invalid"""
+    global title_rules
+    desktop = section(config, 'desktop', {'app_patterns', 'allowed_apps', 'blocked_apps'})
+    app_patterns = desktop.get('app_patterns', APP_PATTERNS)
+    if not isinstance(app_patterns, dict):
+        raise ConfigError("'desktop.app_patterns' must be an object")
+    for app_name, patterns in app_patterns.items():
+        check_object(f"desktop.app_patterns.{app_name}", patterns, _APP_PATTERN_KEYS)
+        if not patterns.get('wm_class'):
+            raise ConfigError(f"'desktop.app_patterns.{app_name}.wm_class' must list at least one class")
+        for key in _APP_PATTERN_KEYS:
+            check_strings(f"desktop.app_patterns.{app_name}.{key}", patterns.get(key, []))
+    allowed_apps = desktop.get('allowed_apps', sorted(ALLOWED_APPS))
+    blocked_apps = desktop.get('blocked_apps', sorted(BLOCKED_APPS))
+    check_strings('desktop.allowed_apps', allowed_apps)
+    check_strings('desktop.blocked_apps', blocked_apps)
+
+    title_rules = TitleRules(app_patterns, allowed_apps, blocked_apps)
 
 
 def check_block(window: WindowInfo) -> BlockDecision:
@@ -237,66 +547,65 @@ def check_block(window: WindowInfo) -> BlockDecision:
     )
 
 
-def show_notification(title: str, message: str, urgency: str = "critical"):
-    """Show desktop notification"""
-    try:
-        subprocess.run([
-            'notify-send',
-            '-u', urgency,
-            '-a', 'TotalControl',
-            title,
-            message
-        ], timeout=5)
-    except Exception as e:
-        print(f"Error showing notification: {e}", file=sys.stderr)
+def show_notification(title: str, message: str, urgency: str = "critical", source: str = "default"):
+    """Queue a desktop notification (sent in the background, coalesced and rate-limited per source)"""
+    get_notifier("TotalControl").notify(title, message, urgency, source)
 
 
-def monitor_loop(interval: float = 1.0, verbose: bool = False):
+def monitor_loop(interval: float = 1.0, verbose: bool = False, use_events: bool = True):
     """Main monitoring loop"""
     print("TotalControl Desktop Monitor started")
     print("Monitoring window focus for DM/Feed detection...")
     print("Press Ctrl+C to stop\n")
 
+    config = None
+    if ConfigWatcher is not None:
+        config = ConfigWatcher(CONFIG_FILE, apply_window_config, "desktop patterns")
+        config.start()
+
     last_blocked_window = None
     last_decision = None
 
     while True:
         try:
-            window = get_active_window()
+            for window in window_changes(interval, use_events):
+                decision = check_block(window)
 
-            if window is None:
-                time.sleep(interval)
-                continue
+                # Only act on changes
+                if window.window_id != last_blocked_window or \
+                   (last_decision and decision.should_block != last_decision.should_block):
 
-            decision = check_block(window)
+                    if verbose:
+                        print(f"[{decision.app_name}] {window.title[:50]}")
+                        print(f"  Screen: {decision.screen_type.value}")
+                        print(f"  Blocked: {decision.should_block}")
+                        if decision.should_block:
+                            print(f"  Reason: {decision.reason}")
+                        print()
 
-            # Only act on changes
-            if window.window_id != last_blocked_window or \
-               (last_decision and decision.should_block != last_decision.should_block):
-
-                if verbose:
-                    print(f"[{decision.app_name}] {window.title[:50]}")
-                    print(f"  Screen: {decision.screen_type.value}")
-                    print(f"  Blocked: {decision.should_block}")
                     if decision.should_block:
-                        print(f"  Reason: {decision.reason}")
-                    print()
-
-                if decision.should_block:
-                    show_notification(
-                        "TotalControl - BLOCKED",
-                        decision.reason
-                    )
-                    # Could also minimize window or show overlay
-                    # subprocess.run(['xdotool', 'windowminimize', window.window_id])
-
-                last_blocked_window = window.window_id
-                last_decision = decision
+                        show_notification(
+                            "TotalControl - BLOCKED",
+                            decision.reason,
+                            source=decision.app_name
+                        )
+                        # Could also minimize window or show overlay
+                        # subprocess.run(['xdotool', 'windowminimize', window.window_id])
 
-            time.sleep(interval)
+                    last_blocked_window = window.window_id
+                    last_decision = decision
 
         except KeyboardInterrupt:
             print("\nMonitor stopped")
+            memo = title_rules.memo
+            print(f"Screen type memo: {memo.hits}/{memo.hits + memo.misses} "
+                  f"hits, window cache: {window_cache.hits}/{window_cache.hits + window_cache.misses}")
+            if config is not None and config.reloads + config.rejected:
+                print(f"Pattern config: version {config.version}, {config.reloads} reloads "
+                      f"(last {config.last_latency * 1000:.1f}ms), {config.rejected} rejected")
+            print(f"Notifications: {get_notifier().summary()}")
+            if config is not None:
+                config.stop()
             break
         except Exception as e:
             print(f"Error in monitor loop: {e}", file=sys.stderr)
@@ -350,10 +659,40 @@ def test_patterns():
     return failed == 0
 
 
+def replay_titles(path: str):
+    """Classify recorded (wm_class, title) lines and report throughput and memo hit rate"""
+    with open(path, 'r', errors='replace') as f:
+        windows = [WindowInfo(window_id="replay", pid=0, wm_class=wm_class, title=title)
+                   for wm_class, _, title in (line.rstrip('\n').partition('\t') for line in f)]
+    if not windows:
+        print(f"No titles in {path}")
+        return
+
+    counts = {}
+    started = time.perf_counter()
+    for window in windows:
+        screen_type = detect_screen_type(window)[1]
+        counts[screen_type] = counts.get(screen_type, 0) + 1
+    elapsed = time.perf_counter() - started
+
+    for screen_type, count in sorted(counts.items(), key=lambda x: -x[1]):
+        print(f"  {screen_type.value:15} {count:8}")
+    print(f"{len(windows)} titles in {elapsed:.3f}s ({len(windows) / elapsed:,.0f}/s), "
+          f"memo hit rate {title_rules.memo.hit_rate:.1%}")
+
+
 if __name__ == "__main__":
     if "--test" in sys.argv:
         success = test_patterns()
         sys.exit(0 if success else 1)
 
+    if "--replay" in sys.argv:
+        i = sys.argv.index("--replay")
+        if i + 1 >= len(sys.argv):
+            print("Usage: window_monitor.py --replay <titles.tsv>")
+            sys.exit(1)
+        replay_titles(sys.argv[i + 1])
+        sys.exit(0)
+
     verbose = "-v" in sys.argv or "--verbose" in sys.argv
-    monitor_loop(interval=0.5, verbose=verbose)
+    monitor_loop(interval=0.5, verbose=verbose, use_events="--poll" not in sys.argv)
@@ -0,0 +1,218 @@
+"""
+TotalControl Config Watch
+
+Pattern tables can be overridden by ~/.totalcontrol/patterns.json, which is
+reloaded while the monitors run:
+
+    {
+      "format": 1,
+      "version": 12,
+      "ocr": {
+        "user_config": {"discord_username": "rhodes"},
+        "patterns": {...},        # replaces screen_analyzer.PATTERNS
+        "app_specific": {...},
+        "reply_patterns": [...]
+      },
+      "desktop": {
+        "app_patterns": {...},    # replaces window_monitor.APP_PATTERNS
+        "allowed_apps": [...],
+        "blocked_apps": [...]
+      }
+    }
+
+"version" is the config's own revision, reported on every reload. Sections
+and keys left out keep the built-in tables; unknown keys (typos) make the
+config invalid.
+
+ConfigWatcher watches the file's directory with inotify (editors often save
+by writing a new file and renaming it over the old one) and falls back to
+polling the file's mtime. Each change is loaded, compiled and swapped in by a
+background thread; a config that fails to parse or compile is rejected and
+the last good one stays in use.
+"""
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+CONFIG_FORMAT = 1
+POLL_INTERVAL = 2.0   # Seconds between mtime checks without inotify
+SETTLE_DELAY = 0.05   # Wait for a burst of writes to finish before loading
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+class ConfigError(ValueError):
+    """Config file is unreadable or invalid"""
+
+
+def load_config(path: Path) -> dict:
+    """Parsed config file, checked for a supported format and a version"""
+    try:
+        with open(path, 'r') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ConfigError(str(e)) from e
+    if not isinstance(config, dict):
+        raise ConfigError("top level must be an object")
+    if config.get('format') != CONFIG_FORMAT:
+        raise ConfigError(f"unsupported format {config.get('format')!r} (expected {CONFIG_FORMAT})")
+    if not isinstance(config.get('version'), int):
+        raise ConfigError("'version' must be an integer")
+    return config
+
+
+def section(config: dict, name: str, allowed) -> dict:
+    """A config section (empty if absent), checked to be an object with only allowed keys"""
+    value = config.get(name, {})
+    check_object(name, value, allowed)
+    return value
+
+
+def check_object(name: str, value, allowed):
+    """value is an object whose keys are all in allowed"""
+    if not isinstance(value, dict):
+        raise ConfigError(f"'{name}' must be an object")
+    unknown = set(value).difference(allowed)
+    if unknown:
+        raise ConfigError(f"'{name}' has unknown keys {sorted(unknown)} (expected {sorted(allowed)})")
+
+
+def check_strings(name: str, value):
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ConfigError(f"'{name}' must be a list of strings")
+
+
+def _inotify_fd(directory: Path) -> Optional[int]:
+    """Non-blocking inotify descriptor watching directory, or None without inotify"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(str(directory)), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _event_names(data: bytes):
+    offset = 0
+    while offset + _EVENT_HEADER.size <= len(data):
+        _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+        offset += _EVENT_HEADER.size
+        yield data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+        offset += length
+
+
+class ConfigWatcher:
+    """
+    Calls apply(config) with each new valid version of the file. apply must
+    compile everything first and swap it in last, raising to reject the
+    config. Reloads run on the watcher thread, off the monitor's loop.
+    """
+
+    def __init__(self, path: Path, apply: Callable[[dict], None], name: str = "patterns"):
+        self.path = Path(path)
+        self.apply = apply
+        self.name = name
+        self.version: Optional[int] = None   # Version in use, None for the built-in tables
+        self.reloads = 0
+        self.rejected = 0
+        self.last_latency = 0.0              # Seconds from file change to swap
+        self._running = False
+        self._signature = None
+
+    def load(self, changed_at: Optional[float] = None) -> bool:
+        """Load and apply the file now; False if it is missing or rejected"""
+        self._signature = self._stat()
+        if self._signature is None:
+            return False
+        try:
+            config = load_config(self.path)
+            self.apply(config)
+        except Exception as e:
+            self.rejected += 1
+            kept = f"version {self.version}" if self.version is not None else "built-in patterns"
+            print(f"[Config] Rejected {self.path}: {e} - keeping {kept}", file=sys.stderr)
+            return False
+        self.version = config['version']
+        self.reloads += 1
+        if changed_at is None:
+            print(f"[Config] {self.name}: version {self.version} loaded from {self.path}", file=sys.stderr)
+        else:
+            self.last_latency = time.monotonic() - changed_at
+            print(f"[Config] {self.name}: version {self.version} in use "
+                  f"({self.last_latency * 1000:.1f}ms after the change)", file=sys.stderr)
+        return True
+
+    def start(self):
+        """Load the file if present, then reload on every change in the background"""
+        if self._running:
+            return
+        self._running = True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Watch before the first load so no change in between is missed
+        fd = _inotify_fd(self.path.parent)
+        self.load()
+        threading.Thread(target=self._watch, args=(fd,), daemon=True, name=f"config-{self.name}").start()
+
+    def stop(self):
+        self._running = False
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _watch(self, fd: Optional[int]):
+        try:
+            if fd is None:
+                self._poll()
+            else:
+                self._watch_inotify(fd)
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def _watch_inotify(self, fd: int):
+        while self._running:
+            if not select.select([fd], [], [], 1.0)[0]:
+                continue
+            changed_at = time.monotonic()
+            relevant = False
+            # Collect the whole burst (write, close, rename) before loading
+            while select.select([fd], [], [], SETTLE_DELAY)[0]:
+                try:
+                    data = os.read(fd, 65536)
+                except BlockingIOError:
+                    break
+                relevant |= self.path.name in _event_names(data)
+            if relevant and self._stat() != self._signature:
+                self.load(changed_at)
+
+    def _poll(self):
+        while self._running:
+            time.sleep(POLL_INTERVAL)
+            if self._stat() != self._signature:
+                self.load(time.monotonic())
@@ -0,0 +1,486 @@
+"""
+TotalControl History Store
+
+Indexed storage for screen analyses (SQLite, WAL mode). Replaces scanning
+screens.jsonl: recent rows, time ranges and per-app queries only touch the
+rows they return. Rows are the same dicts that used to be JSONL lines.
+
+Every append also bumps rolling counters (per screen type, app, hour of day
+and day, with blocked counts) in the same transaction, so statistics cover
+the whole history without reading it. `rebuild_stats()` recomputes them.
+Rows with a 'batch_id' re-score saved screenshots rather than record screens
+seen, and are left out of the counters.
+
+Existing screens.jsonl files are imported once when the database is created,
+or explicitly with `screen_analyzer.py --import-history <file>`.
+
+HistoryWriter moves appends off the caller's thread: rows are queued and a
+background thread commits them in batches (group commit), fsyncing according
+to a durability policy.
+"""
+
+import json
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS screens (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    app_hint TEXT NOT NULL DEFAULT '',
+    screen_type TEXT NOT NULL,
+    should_block INTEGER NOT NULL,
+    row TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_screens_timestamp ON screens(timestamp);
+CREATE INDEX IF NOT EXISTS idx_screens_app ON screens(app_hint, id);
+CREATE TABLE IF NOT EXISTS imports (
+    path TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    done INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_items (
+    batch_id TEXT NOT NULL,
+    item TEXT NOT NULL,
+    PRIMARY KEY (batch_id, item)
+);
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY,
+    row_id INTEGER NOT NULL,
+    label TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    blocked INTEGER NOT NULL,
+    PRIMARY KEY (dimension, key)
+);
+"""
+
+# Counter dimensions and how to derive the key from a row's columns
+STAT_DIMENSIONS = ('total', 'type', 'app', 'hour', 'day')
+
+_STAT_KEY_SQL = {
+    'total': "''",
+    'type': "screen_type",
+    'app': "app_hint",
+    'hour': "substr(timestamp, 12, 2)",
+    'day': "substr(timestamp, 1, 10)",
+}
+
+IMPORT_BATCH = 10000
+
+# Durability policy -> SQLite synchronous setting (WAL mode)
+#   none:     never fsync; the OS writes data back when it likes
+#   periodic: commits aren't fsynced, checkpoints (every fsync_interval) are
+#   batch:    every committed batch is fsynced
+DURABILITY = {'none': 'OFF', 'periodic': 'NORMAL', 'batch': 'FULL'}
+
+WRITE_RETRIES = 5       # Failed commits of a batch before its rows are tried one by one
+RETRY_DELAY_MAX = 60.0  # Seconds; the delay between retries doubles up to this
+
+
+def _stat_keys(timestamp: str, app_hint: str, screen_type: str) -> tuple:
+    """Counter keys for one row, in STAT_DIMENSIONS order (matches _STAT_KEY_SQL)"""
+    return ('', screen_type, app_hint, timestamp[11:13], timestamp[:10])
+
+
+def _columns(row: dict) -> tuple:
+    return (
+        row.get('timestamp', ''),
+        row.get('app_hint') or '',
+        row.get('screen_type', 'unknown'),
+        1 if row.get('should_block') else 0,
+        json.dumps(row),
+    )
+
+
+class HistoryStore:
+    """Append-only analysis history. Safe to share between threads."""
+
+    def __init__(self, path: Path, legacy_jsonl: Optional[Path] = None, durability: str = 'periodic'):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not self.path.exists()
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={DURABILITY[durability]}")
+        has_stats = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats'").fetchone()
+        self._conn.executescript(SCHEMA)
+        if not has_stats and not is_new:
+            self.rebuild_stats()
+
+        # Also resumes an import that an earlier start didn't finish
+        if legacy_jsonl is not None and Path(legacy_jsonl).exists() and \
+                self.imported_rows(legacy_jsonl) is None:
+            count = self.import_jsonl(legacy_jsonl)
+            print(f"[History] Imported {count} rows from {legacy_jsonl}", file=sys.stderr)
+
+    def append(self, row: dict):
+        self.append_many([row])
+
+    def append_many(self, rows: Iterable[dict], progress: Optional[tuple] = None,
+                    items: Optional[tuple] = None):
+        """
+        Append rows. `progress` = (batch_id, done) is recorded in the same
+        transaction so an interrupted batch resumes exactly after these rows;
+        `items` = (batch_id, [item, ...]) marks those items of a batch done.
+        """
+        rows = list(rows)
+        columns = [_columns(row) for row in rows]
+
+        # Aggregate the batch before touching the counters
+        counters = {}
+        for row, (timestamp, app_hint, screen_type, blocked, _) in zip(rows, columns):
+            if row.get('batch_id'):
+                continue
+            for dimension, key in zip(STAT_DIMENSIONS, _stat_keys(timestamp, app_hint, screen_type)):
+                counter = counters.setdefault((dimension, key), [0, 0])
+                counter[0] += 1
+                counter[1] += blocked
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO screens (timestamp, app_hint, screen_type, should_block, row) "
+                "VALUES (?, ?, ?, ?, ?)",
+                columns
+            )
+            self._conn.executemany(
+                "INSERT INTO stats (dimension, key, count, blocked) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (dimension, key) DO UPDATE SET "
+                "count = count + excluded.count, blocked = blocked + excluded.blocked",
+                [(dimension, key, count, blocked)
+                 for (dimension, key), (count, blocked) in counters.items()]
+            )
+            if progress is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO batches (batch_id, done) VALUES (?, ?)", progress)
+            if items is not None:
+                batch_id, done = items
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO batch_items (batch_id, item) VALUES (?, ?)",
+                    [(batch_id, item) for item in done])
+
+    def batch_progress(self, batch_id: str) -> int:
+        """Number of leading items of a batch already stored"""
+        with self._lock:
+            row = self._conn.execute("SELECT done FROM batches WHERE batch_id = ?",
+                                     (batch_id,)).fetchone()
+        return row[0] if row else 0
+
+    def batch_items(self, batch_id: str) -> set:
+        """Items of a batch already stored (see append_many's `items`)"""
+        with self._lock:
+            cursor = self._conn.execute("SELECT item FROM batch_items WHERE batch_id = ?", (batch_id,))
+            return {item for (item,) in cursor}
+
+    def stats(self, dimension: str) -> dict:
+        """Counters for one dimension: key -> (count, blocked)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT key, count, blocked FROM stats WHERE dimension = ?", (dimension,))
+            return {key: (count, blocked) for key, count, blocked in cursor}
+
+    def rebuild_stats(self):
+        """Recompute all counters from the stored rows"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM stats")
+            for dimension in STAT_DIMENSIONS:
+                key_sql = _STAT_KEY_SQL[dimension]
+                self._conn.execute(
+                    f"INSERT INTO stats (dimension, key, count, blocked) "
+                    f"SELECT ?, {key_sql}, COUNT(*), SUM(should_block) FROM screens "
+                    f"WHERE json_extract(row, '$.batch_id') IS NULL GROUP BY {key_sql}",
+                    (dimension,)
+                )
+
+    def recent(self, limit: int = 100, app: Optional[str] = None) -> List[dict]:
+        """Last `limit` rows (optionally for one app), oldest first"""
+        if app is None:
+            sql, args = "SELECT id, row FROM screens ORDER BY id DESC LIMIT ?", (limit,)
+        else:
+            sql, args = ("SELECT id, row FROM screens WHERE app_hint = ? ORDER BY id DESC LIMIT ?",
+                         (app, limit))
+        rows = self._query(sql, args)
+        rows.reverse()
+        return rows
+
+    def between(self, start: Optional[str] = None, end: Optional[str] = None,
+                app: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """Rows with start <= timestamp < end (ISO strings), oldest first"""
+        clauses, args = [], []
+        if start:
+            clauses.append("timestamp >= ?")
+            args.append(start)
+        if end:
+            clauses.append("timestamp < ?")
+            args.append(end)
+        if app is not None:
+            clauses.append("app_hint = ?")
+            args.append(app)
+
+        sql = "SELECT id, row FROM screens"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return self._query(sql, args)
+
+    def rows_after(self, row_id: int = 0, batch: int = IMPORT_BATCH) -> Iterator[Tuple[int, dict]]:
+        """(id, row) for every row with id > row_id, in id order, read in batches"""
+        while True:
+            with self._lock:
+                chunk = self._conn.execute(
+                    "SELECT id, row FROM screens WHERE id > ? ORDER BY id LIMIT ?",
+                    (row_id, batch)).fetchall()
+            for row_id, row in chunk:
+                yield row_id, json.loads(row)
+            if len(chunk) < batch:
+                return
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM screens").fetchone()[0]
+
+    def _query(self, sql: str, args) -> List[dict]:
+        """Rows of (id, row) results, each with its 'id' added"""
+        with self._lock:
+            cursor = self._conn.execute(sql, args)
+            return [{**json.loads(row), 'id': row_id} for row_id, row in cursor]
+
+    def set_label(self, row_id: int, label: str) -> bool:
+        """Record the correct screen type of a row; False if there is no such row"""
+        with self._lock, self._conn:
+            updated = self._conn.execute(
+                "UPDATE screens SET row = json_set(row, '$.label', ?) WHERE id = ?",
+                (label, row_id)).rowcount
+            if updated:
+                self._conn.execute("INSERT INTO labels (row_id, label) VALUES (?, ?)", (row_id, label))
+        return bool(updated)
+
+    def labels_after(self, label_id: int = 0) -> List[Tuple[int, int, dict]]:
+        """(label id, row id, row) for every label given after label_id, in order"""
+        with self._lock:
+            chunk = self._conn.execute(
+                "SELECT labels.id, screens.id, screens.row FROM labels "
+                "JOIN screens ON screens.id = labels.row_id "
+                "WHERE labels.id > ? ORDER BY labels.id", (label_id,)).fetchall()
+        return [(label_id, row_id, json.loads(row)) for label_id, row_id, row in chunk]
+
+    def imported_rows(self, path: Path) -> Optional[int]:
+        """Rows a finished import of path stored, None if it wasn't imported (completely)"""
+        with self._lock:
+            done = self._conn.execute("SELECT rows FROM imports WHERE path = ?",
+                                      (str(Path(path).resolve()),)).fetchone()
+        return done[0] if done else None
+
+    def import_jsonl(self, path: Path) -> int:
+        """
+        Import a screens.jsonl file once; returns rows imported by this call.
+        Each batch records how many lines it consumed, so an interrupted
+        import resumes after the last committed batch.
+        """
+        path = Path(path).resolve()
+        done = self.imported_rows(path)
+        if done is not None:
+            print(f"[History] {path} already imported ({done} rows)", file=sys.stderr)
+            return 0
+
+        batch_id = f"import:{path}"
+        skip = self.batch_progress(batch_id)
+        if skip:
+            print(f"[History] Resuming import of {path} after line {skip}", file=sys.stderr)
+
+        earlier = imported = lines = 0
+        batch = []
+        with open(path, 'r') as f:
+            for line in f:
+                lines += 1
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if lines <= skip:
+                    earlier += 1  # Stored by the interrupted run
+                    continue
+                batch.append(row)
+                if len(batch) >= IMPORT_BATCH:
+                    self.append_many(batch, progress=(batch_id, lines))
+                    imported += len(batch)
+                    batch = []
+        if batch:
+            self.append_many(batch, progress=(batch_id, lines))
+            imported += len(batch)
+
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO imports (path, rows) VALUES (?, ?)",
+                               (str(path), earlier + imported))
+            self._conn.execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,))
+        return imported
+
+    def checkpoint(self):
+        """Copy the WAL into the database file, fsyncing both"""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class HistoryWriter:
+    """
+    Background group commit for HistoryStore.append. A batch is committed
+    once it has batch_rows rows or its oldest row is batch_delay seconds
+    old. With 'periodic' durability the database is checkpointed (fsynced)
+    at most fsync_interval seconds after a commit. A batch that keeps
+    failing is retried with a growing delay, then written row by row; rows
+    that still fail are dropped and logged.
+    """
+
+    def __init__(self, store: HistoryStore, durability: str = 'periodic', batch_rows: int = 64,
+                 batch_delay: float = 2.0, fsync_interval: float = 30.0, max_queued: int = 10000):
+        self.store = store
+        self.durability = durability
+        self.batch_rows = batch_rows
+        self.batch_delay = batch_delay
+        self.fsync_interval = fsync_interval
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.commits = 0
+        self.checkpoints = 0
+        self._failures = 0  # Consecutive failed commits of the current batch
+        # Full queue blocks submit(): history rows are never dropped
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="history-writer")
+        self._thread.start()
+
+    def submit(self, row: dict):
+        self._queue.put(row)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Commit every row submitted so far; False if that took longer than timeout"""
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Commit what's queued, fsync and stop the thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _write(self, batch: list) -> bool:
+        """Commit batch; False if it should be retried later"""
+        try:
+            self.store.append_many(batch)
+        except Exception as e:
+            self._failures += 1
+            if self._failures < WRITE_RETRIES:
+                print(f"[History] Write of {len(batch)} rows failed "
+                      f"({self._failures}/{WRITE_RETRIES}), retrying: {e}", file=sys.stderr)
+                return False
+            self._write_rows(batch)
+        else:
+            self.rows_written += len(batch)
+            self.commits += 1
+        self._failures = 0
+        return True
+
+    def _write_rows(self, batch: list):
+        """Commit rows one at a time, dropping the ones that fail"""
+        dropped, error = 0, None
+        for row in batch:
+            try:
+                self.store.append_many([row])
+            except Exception as e:
+                dropped, error = dropped + 1, e
+                continue
+            self.rows_written += 1
+            self.commits += 1
+        if dropped:
+            self.rows_dropped += dropped
+            print(f"[History] Dropped {dropped} of {len(batch)} rows that could not be stored: {error}",
+                  file=sys.stderr)
+
+    def _retry_delay(self) -> float:
+        return min(self.batch_delay * 2 ** (self._failures - 1), RETRY_DELAY_MAX)
+
+    def _run(self):
+        batch, waiters = [], []
+        deadline = None   # Commit the batch by then
+        sync_due = None   # Checkpoint by then ('periodic' durability)
+        running = True
+        while running:
+            timeouts = [t for t in (deadline, sync_due) if t is not None]
+            timeout = max(0.0, min(timeouts) - time.monotonic()) if timeouts else None
+            items = []
+            if self._failures and len(batch) >= self.batch_rows:
+                # A full batch waits for its retry: leave new rows queued
+                # (submit blocks once the queue is full) instead of growing it
+                time.sleep(timeout or 0.0)
+            else:
+                try:
+                    items.append(self._queue.get(timeout=timeout))
+                    # Take whatever else is waiting without blocking
+                    while len(items) < self.batch_rows:
+                        items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+            for item in items:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.batch_delay
+
+            now = time.monotonic()
+            if batch and (not running or len(batch) >= self.batch_rows or now >= deadline or
+                          (waiters and not self._failures)):
+                written = self._write(batch)
+                if not written and not running:
+                    # Stopping: keep whatever rows can still be stored
+                    self._write_rows(batch)
+                    self._failures, written = 0, True
+                if written:
+                    batch, deadline = [], None
+                    if self.durability == 'periodic' and sync_due is None:
+                        sync_due = now + self.fsync_interval
+                else:
+                    deadline = now + self._retry_delay()
+
+            if sync_due is not None and (not running or now >= sync_due):
+                try:
+                    self.store.checkpoint()
+                    self.checkpoints += 1
+                except Exception as e:
+                    print(f"[History] Checkpoint failed: {e}", file=sys.stderr)
+                sync_due = None
+
+            # Flush callers wait until their rows are committed
+            if not batch or not running:
+                for done in waiters:
+                    done.set()
+                waiters = []
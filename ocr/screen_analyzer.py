@@ -3,30 +3,60 @@
 TotalControl Screen Analyzer
 
 OCR screenshots to text, store results, classify DM vs Feed.
-Builds dataset over time for pattern learning.
+Builds dataset over time for pattern learning. Pattern tables can be
+overridden in ~/.totalcontrol/patterns.json, reloaded while monitoring.
 
 Usage:
     python screen_analyzer.py screenshot.png
-    python screen_analyzer.py --monitor  # Continuous monitoring
-    python screen_analyzer.py --learn    # Show learned patterns
+    python screen_analyzer.py --monitor [INTERVAL] [--cpu-budget 0.15]  # Continuous monitoring
+    python screen_analyzer.py --learn [--rebuild]  # Train on new history, show learned patterns
+    python screen_analyzer.py --label ROW_ID TYPE  # Correct a stored decision (ids in --history)
+    python screen_analyzer.py --history [N] [--app APP] [--since ISO] [--until ISO]
+    python screen_analyzer.py --import-history [screens.jsonl]
+    python screen_analyzer.py --stats | --rebuild-stats
+    python screen_analyzer.py --batch <dir|glob> [--app APP] [--workers N]
+    python screen_analyzer.py --bench-preprocess <dir|glob> [--app APP] [--limit N]
+    python screen_analyzer.py --bench-tiles <dir|glob> [--tile-size PX] [--workers N] [--limit N]
 """
 
+import asyncio
 import subprocess
 import json
+import glob
+import atexit
+import multiprocessing
+import queue
+import heapq
+import signal
+import threading
 import os
 import sys
 import time
 import hashlib
+import itertools
 import re
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from dataclasses import dataclass, asdict
-from typing import Optional, List, Dict
+from functools import lru_cache
+from typing import Optional, List, Dict, Union
 from enum import Enum
 
+from config_watch import ConfigError, ConfigWatcher, check_object, check_strings, section
+from history_store import HistoryStore, HistoryWriter
+from screen_capture import Frame, Region, clip_region, frame_fingerprint, get_capture_backend, load_image
+from screen_events import get_screen_events, merge_rect
+from screenshot_store import ScreenshotStore
+from preprocess import preprocess
+from text_model import TextModel, text_features
+from text_similarity import NearDuplicateIndex, minhash, similarity
+
 # Data storage
 DATA_DIR = Path.home() / ".totalcontrol"
-SCREENS_DB = DATA_DIR / "screens.jsonl"
+SCREENS_DB = DATA_DIR / "screens.jsonl"  # Legacy flat log, imported into HISTORY_DB
+HISTORY_DB = DATA_DIR / "screens.db"
 PATTERNS_FILE = DATA_DIR / "learned_patterns.json"
 
 class ScreenType(Enum):
@@ -230,131 +260,941 @@ APP_SPECIFIC = {
     },
 }
 
+# Reply indicators directed at the user (matched case-sensitively on lowered text)
+REPLY_PATTERNS = [
+    r"replied\s+to\s+you",
+    r"mentioned\s+you",
+    r"tagged\s+you",
+    r"@you\b",
+]
+
+
+# ============ COMPILED MATCHER ============
+# PATTERNS/APP_SPECIFIC are compiled once into a single matcher. Each pattern
+# contributes a literal it cannot match without; all literals are found in one
+# pass of a keyword trie, and only patterns that need more than a literal (and
+# whose literal was seen) are run through `re`.
+
+try:  # Python 3.11+
+    from re import _parser as _sre_parse, _constants as _sre
+except ImportError:
+    import sre_parse as _sre_parse, sre_constants as _sre
+
+_REPEAT_OPS = {_sre.MAX_REPEAT, _sre.MIN_REPEAT, getattr(_sre, 'POSSESSIVE_REPEAT', _sre.MAX_REPEAT)}
+_ATOMIC_GROUP = getattr(_sre, 'ATOMIC_GROUP', None)
+
+# Characters re.IGNORECASE matches against ASCII letters that str.lower() keeps
+_LITERAL_FOLD = str.maketrans({'\u0131': 'i', '\u017f': 's'})
+
+
+def _better_literals(a: Optional[frozenset], b: Optional[frozenset]) -> Optional[frozenset]:
+    """Pick the more selective literal set (longest shortest member, then fewest)"""
+    if not b:
+        return a
+    if not a:
+        return b
+    key_a = (min(map(len, a)), -len(a))
+    key_b = (min(map(len, b)), -len(b))
+    return b if key_b > key_a else a
+
+
+def _required_literals(items) -> Optional[frozenset]:
+    """
+    Literals of which at least one occurs in every match of a parsed pattern.
+    Returns None when no such set can be derived (pattern always runs).
+    """
+    best = None
+    run = []
+    for op, av in items:
+        if op == _sre.LITERAL and av < 128:
+            run.append(chr(av).lower())
+            continue
+
+        if run:
+            best = _better_literals(best, frozenset([''.join(run)]))
+            run = []
+
+        if op == _sre.SUBPATTERN:
+            best = _better_literals(best, _required_literals(av[-1]))
+        elif op == _ATOMIC_GROUP:
+            best = _better_literals(best, _required_literals(av))
+        elif op in _REPEAT_OPS and av[0] >= 1:
+            best = _better_literals(best, _required_literals(av[2]))
+        elif op == _sre.BRANCH:
+            alternatives = [_required_literals(alt) for alt in av[1]]
+            if all(alternatives):
+                best = _better_literals(best, frozenset().union(*alternatives))
+
+    if run:
+        best = _better_literals(best, frozenset([''.join(run)]))
+    return best
+
+
+def _trie_regex(words) -> re.Pattern:
+    """
+    Compile keywords into a trie-shaped regex that matches the longest keyword
+    starting at a position. Shorter keywords at the same position are exactly
+    that keyword's prefixes.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def emit(node: dict) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = '(?:' + '|'.join(branches) + ')' if len(branches) > 1 else branches[0]
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body
+
+    return re.compile(emit(trie))
+
+
+class PatternMatcher:
+    """
+    Matches many regexes against one text with a single keyword scan.
+    Patterns are identified by (pattern, flags); `key in matcher.scan(text)`
+    is True exactly when re.search(pattern, text, flags) would match.
+    """
+
+    def __init__(self, patterns: List[tuple]):
+        # key -> (compiled, required literals or None, pattern is one literal)
+        self.entries: Dict[tuple, tuple] = {}
+
+        for key in dict.fromkeys(patterns):
+            pattern, flags = key
+            items = list(_sre_parse.parse(pattern, flags))
+            literals = _required_literals(items)
+            pure = bool(flags & re.IGNORECASE and literals and
+                        all(op == _sre.LITERAL and av < 128 for op, av in items))
+            self.entries[key] = (re.compile(pattern, flags), literals, pure)
+
+        words = set()
+        for _, literals, _ in self.entries.values():
+            words.update(literals or ())
+        self._trie = _trie_regex(words) if words else None
+        self._prefixes = {w: [p for p in words if w.startswith(p)] for w in words}
+
+    def literals_in(self, text_lower: str) -> set:
+        """All keywords occurring in text, found in one pass"""
+        found = set()
+        if self._trie is None:
+            return found
+        if not text_lower.isascii() and ('\u0131' in text_lower or '\u017f' in text_lower):
+            text_lower = text_lower.translate(_LITERAL_FOLD)
+
+        search = self._trie.search
+        pos = 0
+        while True:
+            m = search(text_lower, pos)
+            if m is None:
+                return found
+            found.update(self._prefixes[m.group()])
+            pos = m.start() + 1
+
+    def scan(self, text_lower: str) -> 'MatchSet':
+        return MatchSet(self, text_lower, self.literals_in(text_lower))
+
+
+class MatchSet:
+    """Result of PatternMatcher.scan(); regexes are confirmed on first lookup"""
+
+    def __init__(self, matcher: PatternMatcher, text_lower: str, literals: set):
+        self.matcher = matcher
+        self.text_lower = text_lower
+        self.literals = literals
+        self._results: Dict[tuple, bool] = {}
+
+    def __contains__(self, key: tuple) -> bool:
+        result = self._results.get(key)
+        if result is None:
+            compiled, literals, pure = self.matcher.entries[key]
+            if literals is not None and literals.isdisjoint(self.literals):
+                result = False
+            elif pure:
+                result = True
+            else:
+                result = compiled.search(self.text_lower) is not None
+            self._results[key] = result
+        return result
+
+
+@dataclass
+class _Rule:
+    key: tuple              # (pattern, flags) in the matcher
+    screen_type: ScreenType
+    weight: float
+    label: str              # Reported in matched_patterns
+
+
+@dataclass
+class CompiledPatterns:
+    matcher: PatternMatcher
+    general_rules: List[_Rule]
+    app_rules: Dict[str, List[_Rule]]
+    group_chat: List[tuple]
+    reply: List[tuple]
+    user_config: Dict[str, str]  # Usernames the personal-ping check looks for
+    tables: tuple  # (patterns, app_specific, reply_patterns) it was built from
+
+
+_GROUP_WEIGHTS = {"strong": 2.0, "medium": 0.5}
+_APP_WEIGHT = 1.5  # App-specific boost
+
+_compiled: Optional[CompiledPatterns] = None
+
+
+def compile_patterns() -> CompiledPatterns:
+    """(Re)build the compiled matcher from PATTERNS, APP_SPECIFIC, REPLY_PATTERNS and USER_CONFIG"""
+    global _compiled
+    _compiled = build_patterns(PATTERNS, APP_SPECIFIC, REPLY_PATTERNS, USER_CONFIG)
+    if _classification_cache is not None:
+        _classification_cache.clear()
+    return _compiled
+
+
+def build_patterns(patterns: dict, app_specific: dict, reply_patterns: list,
+                   user_config: dict) -> CompiledPatterns:
+    """Compile pattern tables (raises re.error for an invalid pattern)"""
+    keys = []
+
+    general_rules = []
+    for screen_type_str, pattern_groups in patterns.items():
+        try:
+            screen_type = ScreenType(screen_type_str)
+        except ValueError:
+            continue
+        for group, weight in _GROUP_WEIGHTS.items():
+            for pattern in pattern_groups.get(group, []):
+                key = (pattern, re.IGNORECASE)
+                general_rules.append(_Rule(key, screen_type, weight, f"{group}:{pattern}"))
+                keys.append(key)
+
+    app_rules = {}
+    for app_name, app_patterns in app_specific.items():
+        rules = app_rules.setdefault(app_name, [])
+        for screen_type_str, type_patterns in app_patterns.items():
+            try:
+                screen_type = ScreenType(screen_type_str)
+            except ValueError:
+                continue
+            for pattern in type_patterns:
+                key = (pattern, re.IGNORECASE)
+                rules.append(_Rule(key, screen_type, _APP_WEIGHT, f"app:{app_name}:{pattern}"))
+                keys.append(key)
+
+    group_chat = [(p, re.IGNORECASE) for p in patterns.get("group_chat", {}).get("indicators", [])]
+    reply = [(p, 0) for p in reply_patterns]
+
+    return CompiledPatterns(
+        matcher=PatternMatcher(keys + group_chat + reply),
+        general_rules=general_rules,
+        app_rules=app_rules,
+        group_chat=group_chat,
+        reply=reply,
+        user_config=dict(user_config),
+        tables=(patterns, app_specific, reply_patterns),
+    )
+
+
+def get_compiled_patterns() -> CompiledPatterns:
+    if _compiled is None:
+        # The external config, if there is one, applies from the first use
+        if _pattern_watcher is None:
+            ConfigWatcher(PATTERN_CONFIG_FILE, apply_pattern_config, "ocr patterns").load()
+        if _compiled is None:
+            return compile_patterns()
+    return _compiled
+
+
+# ============ PATTERN CONFIG ============
+# PATTERN_CONFIG_FILE (format in config_watch.py) overrides the tables above.
+# The monitor watches it: a new version (usernames included) is compiled off
+# the hot path into one CompiledPatterns and swapped in with one assignment,
+# so classification never mixes old and new tables; an invalid version is
+# rejected and the previous one stays. The module tables stay the built-ins.
+
+PATTERN_CONFIG_FILE = DATA_DIR / "patterns.json"
+
+_BUILTIN_PATTERNS = {
+    "user_config": USER_CONFIG,
+    "patterns": PATTERNS,
+    "app_specific": APP_SPECIFIC,
+    "reply_patterns": REPLY_PATTERNS,
+}
+
+_pattern_watcher: Optional[ConfigWatcher] = None
+
+
+_SCREEN_TYPE_NAMES = {t.value for t in ScreenType} - {ScreenType.UNKNOWN.value}
+
+
+def _check_tables(patterns, app_specific, reply_patterns):
+    """Reject tables build_patterns would partly ignore (unknown screen types or groups)"""
+    check_object("ocr.patterns", patterns, _SCREEN_TYPE_NAMES | {"group_chat"})
+    for screen_type, groups in patterns.items():
+        allowed = {"indicators"} if screen_type == "group_chat" else set(_GROUP_WEIGHTS)
+        check_object(f"ocr.patterns.{screen_type}", groups, allowed)
+        for group, items in groups.items():
+            check_strings(f"ocr.patterns.{screen_type}.{group}", items)
+
+    if not isinstance(app_specific, dict):
+        raise ConfigError("'ocr.app_specific' must be an object")
+    for app_name, types in app_specific.items():
+        check_object(f"ocr.app_specific.{app_name}", types, _SCREEN_TYPE_NAMES)
+        for screen_type, items in types.items():
+            check_strings(f"ocr.app_specific.{app_name}.{screen_type}", items)
+
+    check_strings("ocr.reply_patterns", reply_patterns)
+
+
+def apply_pattern_config(config: dict):
+    """Compile the config's 'ocr' section and swap it in; raises if it is invalid"""
+    global _compiled
+    tables = {**_BUILTIN_PATTERNS, **section(config, "ocr", set(_BUILTIN_PATTERNS))}
+    user_config = tables["user_config"]
+    if not isinstance(user_config, dict) or not all(isinstance(v, str) for v in user_config.values()):
+        raise ConfigError("'ocr.user_config' must map names to strings")
+    _check_tables(tables["patterns"], tables["app_specific"], tables["reply_patterns"])
+
+    _compiled = build_patterns(tables["patterns"], tables["app_specific"], tables["reply_patterns"],
+                               {**_BUILTIN_PATTERNS["user_config"], **user_config})
+    if _classification_cache is not None:
+        _classification_cache.clear()
+
+
+def watch_pattern_config() -> ConfigWatcher:
+    """Apply PATTERN_CONFIG_FILE now and on every change"""
+    global _pattern_watcher
+    if _pattern_watcher is None:
+        _pattern_watcher = ConfigWatcher(PATTERN_CONFIG_FILE, apply_pattern_config, "ocr patterns")
+        _pattern_watcher.start()
+    return _pattern_watcher
+
 
 # Ping window tracking
 PING_WINDOW_FILE = DATA_DIR / "ping_windows.json"
 PING_WINDOW_DURATION = 180  # 3 minutes after personal ping
+PING_WINDOW_SAVE_DELAY = 5.0  # Debounce for writing ping windows to disk
 
 def ensure_data_dir():
     """Create data directory if needed"""
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 
+class PingWindows:
+    """
+    Active ping windows (channel -> expiry timestamp) held in memory.
+    Lookups are dict reads; a min-heap of expiries drops stale channels.
+    Changes are written to PING_WINDOW_FILE in the background, at most once
+    per PING_WINDOW_SAVE_DELAY, and on exit.
+    """
+
+    def __init__(self, path: Path = PING_WINDOW_FILE, save_delay: float = PING_WINDOW_SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self._expiry: Dict[str, float] = {}
+        self._heap: List[tuple] = []  # (expiry, channel_id), may hold stale entries
+        self._lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                windows = json.load(f)
+        except:
+            return
+        now = time.time()
+        for channel_id, expiry in windows.items():
+            if expiry >= now:
+                self._expiry[channel_id] = expiry
+                heapq.heappush(self._heap, (expiry, channel_id))
+
+    def _expire(self, now: float) -> bool:
+        """Drop expired windows; returns True if any were removed"""
+        removed = False
+        while self._heap and self._heap[0][0] < now:
+            expiry, channel_id = heapq.heappop(self._heap)
+            if self._expiry.get(channel_id) == expiry:
+                del self._expiry[channel_id]
+                removed = True
+        return removed
+
+    def open(self, channel_id: str, duration: float = PING_WINDOW_DURATION):
+        expiry = time.time() + duration
+        with self._lock:
+            self._expiry[channel_id] = expiry
+            heapq.heappush(self._heap, (expiry, channel_id))
+            self._schedule_save()
+
+    def expiry(self, channel_id: str) -> Optional[float]:
+        """Expiry of the channel's active window, or None"""
+        with self._lock:
+            expiry = self._expiry.get(channel_id)
+            if expiry is None:
+                return None
+            now = time.time()
+            if now > expiry:
+                # Expired - clean up
+                if self._expire(now):
+                    self._schedule_save()
+                return None
+            return expiry
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            if self._expire(time.time()):
+                self._schedule_save()
+            return dict(self._expiry)
+
+    def replace(self, windows: dict):
+        with self._lock:
+            self._expiry = dict(windows)
+            self._heap = [(expiry, channel_id) for channel_id, expiry in self._expiry.items()]
+            heapq.heapify(self._heap)
+            self._schedule_save()
+
+    def _schedule_save(self):
+        # Caller holds the lock
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write pending changes now"""
+        with self._lock:
+            if self._save_timer is None:
+                return
+            self._save_timer.cancel()
+            self._save_timer = None
+            windows = dict(self._expiry)
+        try:
+            ensure_data_dir()
+            tmp_path = self.path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(windows, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Error saving ping windows: {e}", file=sys.stderr)
+
+
+_ping_windows = None
+
+def get_ping_windows() -> PingWindows:
+    global _ping_windows
+    if _ping_windows is None:
+        _ping_windows = PingWindows()
+        atexit.register(_ping_windows.flush)
+    return _ping_windows
+
+
 def load_ping_windows() -> dict:
-    """Load active ping windows (channel -> expiry timestamp)"""
-    if not PING_WINDOW_FILE.exists():
-        return {}
-    try:
-        with open(PING_WINDOW_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return {}
+    """Active ping windows (channel -> expiry timestamp)"""
+    return get_ping_windows().snapshot()
 
 
 def save_ping_windows(windows: dict):
-    """Save ping windows"""
-    ensure_data_dir()
-    with open(PING_WINDOW_FILE, 'w') as f:
-        json.dump(windows, f)
+    """Replace all ping windows"""
+    get_ping_windows().replace(windows)
 
 
 def register_personal_ping(channel_id: str):
     """Register a personal ping - opens window for this channel"""
-    windows = load_ping_windows()
-    windows[channel_id] = time.time() + PING_WINDOW_DURATION
-    save_ping_windows(windows)
+    get_ping_windows().open(channel_id, PING_WINDOW_DURATION)
 
 
 def is_ping_window_active(channel_id: str) -> bool:
     """Check if ping window is still active for this channel"""
-    windows = load_ping_windows()
-    if channel_id not in windows:
-        return False
-    if time.time() > windows[channel_id]:
-        # Expired - clean up
-        del windows[channel_id]
-        save_ping_windows(windows)
-        return False
-    return True
+    return get_ping_windows().expiry(channel_id) is not None
+
+
+@lru_cache(maxsize=32)
+def _username_patterns(username: str) -> tuple:
+    """Compiled mention patterns for a configured username"""
+    return (
+        re.compile(rf"@{re.escape(username)}"),
+        re.compile(rf"{re.escape(username)}#\d+"),
+    )
 
 
-def is_personal_ping(text: str, app_hint: str = "") -> bool:
+def is_personal_ping(text: str, app_hint: str = "", hits: Optional['MatchSet'] = None,
+                     compiled: Optional[CompiledPatterns] = None) -> bool:
     """
     Check if text contains a PERSONAL mention of the user.
     Returns False for @everyone/@here/@channel type mentions.
+    `hits` is a precomputed matcher result for text (see classify_text),
+    made with `compiled`.
     """
     text_lower = text.lower()
+    compiled = compiled or get_compiled_patterns()
+    user_config = compiled.user_config
 
-    # Check for generic mentions first - these don't count
-    for generic in GENERIC_MENTIONS:
-        if re.search(generic, text_lower, re.IGNORECASE):
-            # Found generic mention - check if there's ALSO a personal one
-            pass  # Continue checking for personal mention
+    # Generic mentions (GENERIC_MENTIONS) never count on their own - only a
+    # personal mention below does
 
     # Check for personal mention based on configured username
     app_lower = app_hint.lower()
 
-    if "discord" in app_lower and USER_CONFIG.get("discord_username"):
-        username = USER_CONFIG["discord_username"].lower()
+    if "discord" in app_lower and user_config.get("discord_username"):
         # Discord: @username or username#1234
-        if re.search(rf"@{re.escape(username)}", text_lower):
-            return True
-        if re.search(rf"{re.escape(username)}#\d+", text_lower):
+        mention, tag = _username_patterns(user_config["discord_username"].lower())
+        if mention.search(text_lower) or tag.search(text_lower):
             return True
 
-    if ("twitter" in app_lower or "x.com" in app_lower) and USER_CONFIG.get("twitter_username"):
-        username = USER_CONFIG["twitter_username"].lower()
-        if re.search(rf"@{re.escape(username)}", text_lower):
+    if ("twitter" in app_lower or "x.com" in app_lower) and user_config.get("twitter_username"):
+        mention, _ = _username_patterns(user_config["twitter_username"].lower())
+        if mention.search(text_lower):
             return True
 
-    if "slack" in app_lower and USER_CONFIG.get("slack_username"):
-        username = USER_CONFIG["slack_username"].lower()
-        if re.search(rf"@{re.escape(username)}", text_lower):
+    if "slack" in app_lower and user_config.get("slack_username"):
+        mention, _ = _username_patterns(user_config["slack_username"].lower())
+        if mention.search(text_lower):
             return True
 
     # Check for reply indicators directed at user
-    reply_patterns = [
-        r"replied\s+to\s+you",
-        r"mentioned\s+you",
-        r"tagged\s+you",
-        r"@you\b",
-    ]
-    for pattern in reply_patterns:
-        if re.search(pattern, text_lower):
-            return True
+    if hits is None:
+        hits = compiled.matcher.scan(text_lower)
+    return any(key in hits for key in compiled.reply)
 
-    return False
 
-
-def is_group_chat(text: str) -> bool:
+def is_group_chat(text: str, hits: Optional['MatchSet'] = None,
+                  compiled: Optional[CompiledPatterns] = None) -> bool:
     """Detect if this is a group chat (not 1-on-1 DM)"""
-    text_lower = text.lower()
+    compiled = compiled or get_compiled_patterns()
+    if hits is None:
+        hits = compiled.matcher.scan(text.lower())
+    return any(key in hits for key in compiled.group_chat)
+
+
+# ============ OCR BACKENDS ============
+# "pool" keeps long-lived tesserocr workers with the model loaded; "subprocess"
+# runs the tesseract CLI per image. "auto" uses the pool when tesserocr is
+# installed and falls back to subprocess otherwise.
+
+OCR_BACKEND = "auto"
+OCR_WORKERS = 2
+OCR_TIMEOUT = 30  # seconds per image
+OCR_LANG = "eng"
+OCR_PSM = 3
+OCR_STREAMING = True        # Monitor OCRs frames strip by strip and may stop early
+OCR_STREAM_STRIPS = 4       # Horizontal strips per frame, top first
+OCR_STRIP_OVERLAP = 48      # Pixels added above/below a strip so lines aren't cut
+OCR_MIN_WORD_CONF = 30      # Words below this tesseract confidence are dropped
+OCR_EARLY_EXIT_CONF = 75    # Only words this confident can decide early
+EARLY_EXIT_CONFIDENCE = 0.9  # Classifier confidence needed to stop OCR early
+
+# Frame preprocessing before OCR (preprocess.py). Per-app overrides of
+# preprocess.DEFAULT_SETTINGS, matched against the app hint like APP_SPECIFIC.
+PREPROCESS_ENABLED = True
+PREPROCESS_APPS = {
+    "discord": {"binarize": True},  # Flat chat UIs: binarizing strips avatar/emoji noise
+    "slack": {"binarize": True},
+}
 
-    for pattern in PATTERNS.get("group_chat", {}).get("indicators", []):
-        if re.search(pattern, text_lower, re.IGNORECASE):
-            return True
 
-    return False
+# An image file path, or raw pixels from screen_capture
+Image = Union[str, Frame]
 
 
-def ocr_image(image_path: str) -> str:
-    """Extract text from image using tesseract"""
-    try:
-        result = subprocess.run(
-            ['tesseract', image_path, 'stdout', '-l', 'eng', '--psm', '3'],
-            capture_output=True, text=True, timeout=30
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
+class OCRBackend:
+    """Turns an image into text. Errors are reported and yield ''"""
+    name = "base"
+    concurrent = False  # Safe to call from several threads at once
+
+    def ocr(self, image: Image, timeout: float = OCR_TIMEOUT) -> str:
+        raise NotImplementedError
+
+    def ocr_tsv(self, image: Image, timeout: float = OCR_TIMEOUT) -> str:
+        """Tesseract TSV output (one row per page/block/line/word, with confidences)"""
+        raise NotImplementedError
+
+    def cpu_seconds(self) -> float:
+        """CPU used by live helper processes (not yet in os.times() children)"""
+        return 0.0
+
+    def close(self):
+        pass
+
+
+class SubprocessOCR(OCRBackend):
+    """One tesseract process per image. Frames are piped in as PNM, not written to disk."""
+    name = "subprocess"
+    concurrent = True
+
+    def ocr(self, image: Image, timeout: float = OCR_TIMEOUT) -> str:
+        return self._run(image, [], timeout)
+
+    def ocr_tsv(self, image: Image, timeout: float = OCR_TIMEOUT) -> str:
+        return self._run(image, ['tsv'], timeout)
+
+    def _run(self, image: Image, configs: List[str], timeout: float) -> str:
+        if isinstance(image, Frame):
+            source, stdin = 'stdin', image.to_pnm()
         else:
-            print(f"Tesseract error: {result.stderr}", file=sys.stderr)
+            source, stdin = image, None
+        try:
+            result = subprocess.run(
+                ['tesseract', source, 'stdout', '-l', OCR_LANG, '--psm', str(OCR_PSM)] + configs,
+                input=stdin, capture_output=True, timeout=timeout
+            )
+            if result.returncode == 0:
+                return result.stdout.decode('utf-8', 'replace').strip()
+            else:
+                print(f"Tesseract error: {result.stderr.decode('utf-8', 'replace')}", file=sys.stderr)
+                return ""
+        except FileNotFoundError:
+            print("Tesseract not installed. Run: sudo apt install tesseract-ocr", file=sys.stderr)
             return ""
-    except FileNotFoundError:
-        print("Tesseract not installed. Run: sudo apt install tesseract-ocr", file=sys.stderr)
-        return ""
+        except Exception as e:
+            print(f"OCR error: {e}", file=sys.stderr)
+            return ""
+
+
+def _ocr_worker_main(conn, lang: str, psm: int):
+    """Worker process: load the model once, then OCR images sent over conn"""
+    # One thread per process: the pool's processes already use the cores
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    try:
+        from tesserocr import PyTessBaseAPI
+        api = PyTessBaseAPI(lang=lang, psm=psm)
     except Exception as e:
-        print(f"OCR error: {e}", file=sys.stderr)
-        return ""
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        return
+
+    conn.send(('ready', None))
+    with api:
+        while True:
+            try:
+                job = conn.recv()
+            except (EOFError, KeyboardInterrupt):
+                return
+            if job is None:
+                return
+            try:
+                mode, image = job
+                _set_tesserocr_image(api, image)
+                conn.send(('ok', api.GetUTF8Text() if mode == 'text' else api.GetTSVText(0)))
+            except Exception as e:
+                conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+def _ocr_job(image: Image):
+    """Picklable form of an image for tesserocr: a path or raw RGB/gray pixels"""
+    if isinstance(image, Frame):
+        frame = image.to_rgb()
+        return (frame.width, frame.height, frame.bytes_per_pixel, frame.data)
+    return image
+
+
+def _set_tesserocr_image(api, job):
+    if isinstance(job, tuple):
+        width, height, bytes_per_pixel, data = job
+        api.SetImageBytes(data, width, height, bytes_per_pixel, width * bytes_per_pixel)
+    else:
+        api.SetImageFile(job)
+
+
+class InProcessOCR(OCRBackend):
+    """tesserocr in the calling process - for processes that are workers themselves"""
+    name = "inprocess"
+
+    def __init__(self, lang: str = OCR_LANG, psm: int = OCR_PSM):
+        from tesserocr import PyTessBaseAPI
+        self._api = PyTessBaseAPI(lang=lang, psm=psm)
+
+    def ocr(self, image: Image, timeout: float = OCR_TIMEOUT) -> str:
+        try:
+            _set_tesserocr_image(self._api, _ocr_job(image))
+            return self._api.GetUTF8Text().strip()
+        except Exception as e:
+            print(f"OCR error: {e}", file=sys.stderr)
+            return ""
+
+    def ocr_tsv(self, image: Image, timeout: float = OCR_TIMEOUT) -> str:
+        try:
+            _set_tesserocr_image(self._api, _ocr_job(image))
+            return self._api.GetTSVText(0)
+        except Exception as e:
+            print(f"OCR error: {e}", file=sys.stderr)
+            return ""
+
+    def close(self):
+        self._api.End()
+
+
+def _process_cpu_seconds(pid: int) -> float:
+    """utime + stime of a running process (Linux /proc), 0 if unknown"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the parenthesised command name; utime/stime are 14 and 15
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+class _OCRWorker:
+    """Handle on one worker process and its pipe"""
+
+    def __init__(self, ctx, lang: str, psm: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_ocr_worker_main, args=(child_conn, lang, psm), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: float):
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise TimeoutError("worker did not start")
+        status, payload = self.conn.recv()
+        if status != 'ready':
+            raise RuntimeError(payload)
+        self.ready = True
+
+    def request(self, job, timeout: float) -> str:
+        self.wait_ready(timeout)
+        self.conn.send(job)
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"no result after {timeout}s")
+        status, payload = self.conn.recv()
+        if status != 'ok':
+            raise ValueError(payload)
+        return payload
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=1)
+        self.conn.close()
+
+
+class TesseractPool(OCRBackend):
+    """
+    N persistent tesserocr workers. Callers queue for an idle worker; a worker
+    that crashes or exceeds the per-call timeout is killed and replaced.
+    """
+    name = "pool"
+    concurrent = True
+
+    def __init__(self, workers: int = OCR_WORKERS, lang: str = OCR_LANG, psm: int = OCR_PSM,
+                 startup_timeout: float = 20.0):
+        import tesserocr  # noqa: F401 - fail fast so callers can fall back
+
+        self.lang = lang
+        self.psm = psm
+        self.restarts = 0
+        self._ctx = multiprocessing.get_context('spawn')
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = [self._spawn() for _ in range(max(1, workers))]
+
+        # A missing traineddata file fails every worker the same way
+        try:
+            self._workers[0].wait_ready(startup_timeout)
+        except Exception:
+            self.close()
+            raise
+        for worker in self._workers:
+            self._idle.put(worker)
+
+    def _spawn(self) -> _OCRWorker:
+        return _OCRWorker(self._ctx, self.lang, self.psm)
+
+    def grow(self, workers: int):
+        """Start more workers, up to `workers` in all (they load the model on first use)"""
+        with self._lock:
+            while len(self._workers) < workers:
+                worker = self._spawn()
+                self._workers.append(worker)
+                self._idle.put(worker)
+
+    def _replace(self, worker: _OCRWorker) -> _OCRWorker:
+        worker.stop()
+        fresh = self._spawn()
+        with self._lock:
+            self._workers[self._workers.index(worker)] = fresh
+        self.restarts += 1
+        return fresh
+
+    def ocr(self, image: Image, timeout: float = OCR_TIMEOUT) -> str:
+        return self._request('text', image, timeout)
+
+    def ocr_tsv(self, image: Image, timeout: float = OCR_TIMEOUT) -> str:
+        return self._request('tsv', image, timeout)
+
+    def _request(self, mode: str, image: Image, timeout: float) -> str:
+        job = (mode, _ocr_job(image))
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            print(f"OCR error: no worker free after {timeout}s", file=sys.stderr)
+            return ""
+
+        try:
+            return worker.request(job, timeout).strip()
+        except ValueError as e:
+            # Worker is fine, the image was not
+            print(f"OCR error: {e}", file=sys.stderr)
+            return ""
+        except (TimeoutError, EOFError, OSError, RuntimeError) as e:
+            print(f"OCR worker {worker.process.pid} failed ({e or type(e).__name__}) - restarting",
+                  file=sys.stderr)
+            worker = self._replace(worker)
+            return ""
+        finally:
+            self._idle.put(worker)
+
+    def cpu_seconds(self) -> float:
+        return sum(_process_cpu_seconds(worker.process.pid) for worker in self._workers)
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+
+_ocr_backend = None
+
+def get_ocr_backend() -> OCRBackend:
+    """Return the configured OCR backend, starting it on first use"""
+    global _ocr_backend
+    if _ocr_backend is None:
+        if OCR_BACKEND in ("auto", "pool"):
+            try:
+                # Grown for tiled OCR only when a frame is first tiled
+                _ocr_backend = TesseractPool(OCR_WORKERS)
+            except ImportError:
+                if OCR_BACKEND == "pool":
+                    print("tesserocr not installed (pip install tesserocr) - using tesseract CLI",
+                          file=sys.stderr)
+            except Exception as e:
+                print(f"OCR worker pool unavailable ({e}) - using tesseract CLI", file=sys.stderr)
+        if _ocr_backend is None:
+            _ocr_backend = SubprocessOCR()
+        atexit.register(_ocr_backend.close)
+    return _ocr_backend
+
+
+def ocr_image(image: Image) -> str:
+    """Extract text from an image file or captured Frame using tesseract"""
+    return get_ocr_backend().ocr(image)
+
+
+def preprocess_settings(app_hint: str = "") -> dict:
+    """Preprocessing overrides for an app hint"""
+    app_lower = app_hint.lower()
+    for app_name, settings in PREPROCESS_APPS.items():
+        if app_name in app_lower:
+            return settings
+    return {}
+
+
+def prepare_for_ocr(image: Image, app_hint: str = "") -> Image:
+    """Preprocessed copy of a captured frame; files are passed through"""
+    if not PREPROCESS_ENABLED or not isinstance(image, Frame):
+        return image
+    return preprocess(image, preprocess_settings(app_hint))
+
+
+@dataclass
+class OCRWord:
+    text: str
+    conf: float
+    line: tuple  # (y_offset, x_offset, block, paragraph, line) - words sharing it form one text line
+    top: int
+    height: int
+    left: int = 0
+    width: int = 0
+
+
+def parse_tsv(tsv: str, y_offset: int = 0, x_offset: int = 0) -> List[OCRWord]:
+    """Word rows of tesseract TSV output, positions shifted by the offsets"""
+    words = []
+    for row in tsv.splitlines()[1:]:
+        fields = row.split('\t')
+        if len(fields) < 12 or fields[0] != '5' or not fields[11].strip():
+            continue
+        try:
+            conf = float(fields[10])
+            line = (y_offset, x_offset, int(fields[2]), int(fields[3]), int(fields[4]))
+            left, top = int(fields[6]) + x_offset, int(fields[7]) + y_offset
+            width, height = int(fields[8]), int(fields[9])
+        except ValueError:
+            continue
+        words.append(OCRWord(fields[11], conf, line, top, height, left, width))
+    return words
+
+
+def words_to_text(words: List[OCRWord], min_conf: float = OCR_MIN_WORD_CONF) -> str:
+    """Rebuild text lines from words, leaving out those below min_conf"""
+    lines, current, last_line = [], [], None
+    for word in words:
+        if word.line != last_line and current:
+            lines.append(' '.join(current))
+            current = []
+        last_line = word.line
+        if word.conf >= min_conf:
+            current.append(word.text)
+    if current:
+        lines.append(' '.join(current))
+    return '\n'.join(line for line in lines if line)
+
+
+def _strips(frame: Frame, count: int, overlap: int):
+    """(strip frame, keep_from, keep_to) top to bottom; words are kept by vertical centre"""
+    height = -(-frame.height // count)
+    for y in range(0, frame.height, height):
+        top = max(0, y - overlap)
+        strip = frame.crop((0, top, frame.width, min(frame.height, y + height + overlap) - top))
+        yield strip, top, y, y + height
+
+
+def early_decision(text: str, app_hint: str) -> bool:
+    """True if text alone already decides a blocked screen, whatever follows"""
+    screen_type, confidence, matched, personal_ping = _classify_content(text, app_hint)
+    # Group chats need the whole page to rule out a personal mention
+    return (personal_ping is None and screen_type != ScreenType.UNKNOWN
+            and should_block(screen_type) and confidence >= EARLY_EXIT_CONFIDENCE
+            and any(p.startswith(("strong:", "learned:")) for p in matched))
+
+
+def ocr_streaming_words(image: Image, app_hint: str = "") -> tuple:
+    """
+    OCR a frame strip by strip from the top, checking after each strip
+    whether confident words already decide a blocked screen. Returns
+    (words in image coordinates, stopped_early). Frames spanning a grid of
+    tiles (see use_tiles) are OCR'd as parallel tiles instead. Files, and
+    any image when the backend starts a tesseract process per call, are
+    OCR'd in one piece (still with word confidences).
+    """
+    backend = get_ocr_backend()
+    if isinstance(image, Frame) and use_tiles(image, backend):
+        return ocr_tiled_words(image), False
+    if not isinstance(image, Frame) or isinstance(backend, SubprocessOCR):
+        return parse_tsv(backend.ocr_tsv(image)), False
+
+    words = []
+    strips = list(_strips(image, OCR_STREAM_STRIPS, OCR_STRIP_OVERLAP))
+    for i, (strip, offset, keep_from, keep_to) in enumerate(strips):
+        words += [w for w in parse_tsv(backend.ocr_tsv(strip), offset)
+                  if keep_from <= w.top + w.height // 2 < keep_to]
+        if i < len(strips) - 1 and early_decision(words_to_text(words, OCR_EARLY_EXIT_CONF), app_hint):
+            return words, True
+    return words, False
 
 
 def classify_text(text: str, app_hint: str = "", channel_id: str = "") -> tuple[ScreenType, float, List[str]]:
@@ -369,72 +1209,277 @@ def classify_text(text: str, app_hint: str = "", channel_id: str = "") -> tuple[
     - Group chat no ping → BLOCKED
     - Feed/Reels/Explore → BLOCKED
     """
-    text_lower = text.lower()
-    app_lower = app_hint.lower()
-
-    scores = {st: 0.0 for st in ScreenType}
-    matched = {st: [] for st in ScreenType}
+    screen_type, confidence, matched, personal_ping = get_classification_cache().classify(text, app_hint)
 
     # === SPECIAL CASE: Group chat detection ===
-    if is_group_chat(text):
+    # Ping state is applied here, outside the cache
+    if personal_ping is not None:
         # It's a group chat - check for personal ping
-        if is_personal_ping(text, app_hint):
+        if personal_ping:
             # Personal ping! Register window and allow
             if channel_id:
                 register_personal_ping(channel_id)
             return ScreenType.DM, 0.9, ["personal_ping_detected"]
 
         # Check if we're in an active ping window
-        if channel_id and is_ping_window_active(channel_id):
-            remaining = load_ping_windows().get(channel_id, 0) - time.time()
+        expiry = get_ping_windows().expiry(channel_id) if channel_id else None
+        if expiry is not None:
+            remaining = expiry - time.time()
             return ScreenType.DM, 0.8, [f"ping_window_active:{int(remaining)}s"]
 
         # No personal ping, no active window → BLOCK as feed
         return ScreenType.FEED, 0.9, ["group_chat_no_personal_ping"]
 
-    # Check general patterns
-    for screen_type_str, pattern_groups in PATTERNS.items():
-        try:
-            screen_type = ScreenType(screen_type_str)
-        except ValueError:
-            continue
+    return screen_type, confidence, list(matched)
 
-        for pattern in pattern_groups.get("strong", []):
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                scores[screen_type] += 2.0
-                matched[screen_type].append(f"strong:{pattern}")
 
-        for pattern in pattern_groups.get("medium", []):
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                scores[screen_type] += 0.5
-                matched[screen_type].append(f"medium:{pattern}")
+def _classify_content(text: str, app_hint: str, compiled: Optional[CompiledPatterns] = None) -> tuple:
+    """
+    The part of classify_text that depends only on the text and app:
+    (screen_type, confidence, matched_patterns, personal_ping). personal_ping
+    is None unless the text is a group chat.
+    """
+    text_lower = text.lower()
+    app_lower = app_hint.lower()
 
-    # Boost with app-specific patterns
-    for app_name, app_patterns in APP_SPECIFIC.items():
-        if app_name in app_lower:
-            for screen_type_str, patterns in app_patterns.items():
-                try:
-                    screen_type = ScreenType(screen_type_str)
-                except ValueError:
-                    continue
-                for pattern in patterns:
-                    if re.search(pattern, text_lower, re.IGNORECASE):
-                        scores[screen_type] += 1.5  # App-specific boost
-                        matched[screen_type].append(f"app:{app_name}:{pattern}")
+    # Single scan over the text for every pattern we know about
+    compiled = compiled or get_compiled_patterns()
+    hits = compiled.matcher.scan(text_lower)
+
+    if is_group_chat(text, hits, compiled):
+        return ScreenType.FEED, 0.9, (), is_personal_ping(text, app_hint, hits, compiled)
+
+    scores, matched = _rule_scores(compiled, hits, app_lower)
 
     # Find best match
     best_type = max(scores, key=scores.get)
     best_score = scores[best_type]
 
+    # A confident learned model overrides the hand-weighted scores
+    model = get_learned_model()
+    if model is not None:
+        rule_labels = [label for labels in matched.values() for label in labels]
+        label, probability = model.predict(learn_features(text, app_hint, rule_labels))
+        if label != ScreenType.UNKNOWN.value and probability >= LEARN_MIN_CONFIDENCE:
+            learned_type = ScreenType(label)
+            return learned_type, probability, (f"learned:{label}", *matched[learned_type]), None
+
     # Calculate confidence (0-1)
     total_score = sum(scores.values())
     confidence = best_score / total_score if total_score > 0 else 0
 
     # If no strong matches, return unknown
     if best_score < 1.0:
-        return ScreenType.UNKNOWN, 0.0, []
+        return ScreenType.UNKNOWN, 0.0, (), None
+
+    return best_type, min(confidence, 1.0), tuple(matched[best_type]), None
+
+
+# ============ CLASSIFICATION CACHE ============
+# The same channel or timeline text is OCR'd over and over. Content results
+# are cached by (lowercased text, app, configured usernames) - everything
+# _classify_content reads. Ping windows are never cached: classify_text
+# applies them to the cached group-chat result on every call.
+
+CLASSIFY_CACHE_SIZE = 1024
+CLASSIFY_CACHE_TTL = 600  # Seconds
+
+
+class ClassificationCache:
+    """Bounded LRU with TTL in front of _classify_content"""
+
+    def __init__(self, max_entries: int = CLASSIFY_CACHE_SIZE, ttl: float = CLASSIFY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text: str, app_hint: str, user_config: dict) -> tuple:
+        # Matching is case-insensitive throughout, so case is normalized away.
+        # Whitespace is kept: patterns like what.?s can match it.
+        digest = hashlib.blake2b(text.lower().encode(), digest_size=16).digest()
+        usernames = (user_config.get("discord_username"), user_config.get("twitter_username"),
+                     user_config.get("slack_username"))
+        return digest, app_hint.lower(), usernames
+
+    def classify(self, text: str, app_hint: str) -> tuple:
+        compiled = get_compiled_patterns()
+        key = self._key(text, app_hint, compiled.user_config)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        result = _classify_content(text, app_hint, compiled)
+        with self._lock:
+            # Patterns were swapped meanwhile: the result may be stale
+            if compiled is not _compiled:
+                return result
+            self._entries[key] = (now + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Drop everything, e.g. after patterns or the learned model change"""
+        with self._lock:
+            self._entries.clear()
+
+
+_classification_cache = None
+
+def get_classification_cache() -> ClassificationCache:
+    global _classification_cache
+    if _classification_cache is None:
+        _classification_cache = ClassificationCache()
+    return _classification_cache
+
+
+def _rule_scores(compiled: CompiledPatterns, hits: 'MatchSet', app_lower: str) -> tuple:
+    """Weighted regex scores and matched rule labels per ScreenType"""
+    scores = {st: 0.0 for st in ScreenType}
+    matched = {st: [] for st in ScreenType}
+
+    # Check general patterns
+    for rule in compiled.general_rules:
+        if rule.key in hits:
+            scores[rule.screen_type] += rule.weight
+            matched[rule.screen_type].append(rule.label)
+
+    # Boost with app-specific patterns
+    for app_name, rules in compiled.app_rules.items():
+        if app_name in app_lower:
+            for rule in rules:
+                if rule.key in hits:
+                    scores[rule.screen_type] += rule.weight
+                    matched[rule.screen_type].append(rule.label)
+
+    return scores, matched
+
+
+# ============ LEARNED MODEL ============
+# A naive Bayes model (text_model.py) trained from the history. Labels are
+# confident regex decisions, or a screen type given with `--label` (weighted
+# LEARN_LABEL_WEIGHT times, so corrections outweigh the regex rows they
+# contradict). The regex rules that fired are features, so the model learns
+# which new UI strings go with which screen type. Group-chat rows are skipped
+# unless labeled: their decision depends on mentions and ping state, which
+# classify_text handles before the model. `--learn` folds in rows stored and
+# labels given since the last run.
+
+LEARN_MIN_ROWS = 200              # Model is ignored until trained on this many rows
+LEARN_MIN_CONFIDENCE = 0.9        # Posterior needed to override the regex scores
+LEARN_MIN_LABEL_CONFIDENCE = 0.6  # Regex confidence needed to use a row as a label
+LEARN_LABEL_WEIGHT = 20           # Regex-labeled rows a hand-labeled row counts as
+
+# Group-chat decisions: they hinge on mentions and ping state, not on the page
+GROUP_CHAT_PATTERNS = ('personal_ping_detected', 'ping_window_active', 'group_chat_no_personal_ping')
+_STATEFUL_PATTERNS = GROUP_CHAT_PATTERNS + ('learned:',)
+
+
+def learn_features(text: str, app_hint: str, rule_labels: List[str]) -> List[str]:
+    extra = [f"app={app_hint.lower()}"] + [f"rule={label}" for label in rule_labels]
+    return text_features(text, extra)
+
+
+def _training_example(row: dict) -> Optional[tuple]:
+    """(features, label, weight) for a history row, or None if it can't serve as a label"""
+    if row.get('batch_id'):
+        return None  # --batch re-score of a saved screenshot, already in the history
+    label, weight = row.get('label'), LEARN_LABEL_WEIGHT
+    if not label:
+        weight = 1
+        patterns = row.get('matched_patterns') or []
+        if any(p.startswith(_STATEFUL_PATTERNS) for p in patterns):
+            return None
+        label = row.get('screen_type')
+        if label != ScreenType.UNKNOWN.value and row.get('confidence', 0) < LEARN_MIN_LABEL_CONFIDENCE:
+            return None
+
+    text, app_hint = row.get('raw_text', ''), row.get('app_hint') or ''
+    compiled = get_compiled_patterns()
+    _, matched = _rule_scores(compiled, compiled.matcher.scan(text.lower()), app_hint.lower())
+    rule_labels = [l for labels in matched.values() for l in labels]
+    return learn_features(text, app_hint, rule_labels), label, weight
+
+
+_learned_model = None
+_learned_checked = False
+
+def get_learned_model() -> Optional[TextModel]:
+    """The trained model from PATTERNS_FILE, or None if absent or too small"""
+    global _learned_model, _learned_checked
+    if not _learned_checked:
+        _learned_checked = True
+        try:
+            model = TextModel.load(PATTERNS_FILE)
+            if model is not None and model.rows >= LEARN_MIN_ROWS:
+                _learned_model = model
+        except ImportError:
+            pass  # numpy not installed - regex scoring only
+        except Exception as e:
+            print(f"[Learn] Ignoring {PATTERNS_FILE}: {e}", file=sys.stderr)
+    return _learned_model
+
+
+def learn_from_history(rebuild: bool = False) -> TextModel:
+    """Train on history rows not yet seen by the saved model and save it"""
+    global _learned_model, _learned_checked
+    flush_history()
+    model = None if rebuild else TextModel.load(PATTERNS_FILE)
+    if model is None:
+        model = TextModel([st.value for st in ScreenType])
+
+    store = get_history_store()
+    last_id, last_label = model.trained_through, model.labels_through
+
+    def examples():
+        nonlocal last_id, last_label
+        for row_id, row in store.rows_after(model.trained_through):
+            last_id = row_id
+            example = _training_example(row)
+            if example is not None:
+                yield example
+        # Rows labeled after an earlier run learned them (as their current label)
+        relabeled = set()
+        for label_id, row_id, row in store.labels_after(model.labels_through):
+            last_label = label_id
+            if row_id <= model.trained_through and row_id not in relabeled:
+                relabeled.add(row_id)
+                example = _training_example(row)
+                if example is not None:
+                    yield example
+
+    used = model.update(examples())
+    model.trained_through, model.labels_through = last_id, last_label
+    ensure_data_dir()
+    model.save(PATTERNS_FILE)
 
-    return best_type, min(confidence, 1.0), matched[best_type]
+    _learned_model = model if model.rows >= LEARN_MIN_ROWS else None
+    _learned_checked = True
+    get_classification_cache().clear()
+    print(f"Learned from {used} new rows ({model.rows} total, {len(model.tokens)} features)")
+    return model
+
+
+def show_learned(model: TextModel):
+    if model.rows < LEARN_MIN_ROWS:
+        print(f"Model inactive until trained on {LEARN_MIN_ROWS} rows")
+    for label, docs in zip(model.classes, model.class_docs):
+        if not docs:
+            continue
+        top = model.top_features(label, 8)
+        print(f"\n{label} ({int(docs)} weighted rows):")
+        for token, lift in top:
+            print(f"  {lift:5.1f}  {token}")
 
 
 def should_block(screen_type: ScreenType) -> bool:
@@ -447,19 +1492,12 @@ def should_block(screen_type: ScreenType) -> bool:
     return screen_type not in allowed
 
 
-def analyze_screenshot(image_path: str, app_hint: str = "") -> ScreenAnalysis:
-    """Full analysis pipeline: OCR → Classify → Store"""
-    ensure_data_dir()
-
-    # OCR
-    raw_text = ocr_image(image_path)
+def build_analysis(raw_text: str, app_hint: str = "") -> ScreenAnalysis:
+    """Classify OCR text into a ScreenAnalysis (no screenshot attached yet)"""
     text_hash = hashlib.md5(raw_text.encode()).hexdigest()[:12]
-
-    # Classify
     screen_type, confidence, matched_patterns = classify_text(raw_text, app_hint)
 
-    # Create analysis
-    analysis = ScreenAnalysis(
+    return ScreenAnalysis(
         timestamp=datetime.now().isoformat(),
         app_hint=app_hint,
         screen_type=screen_type,
@@ -468,77 +1506,181 @@ def analyze_screenshot(image_path: str, app_hint: str = "") -> ScreenAnalysis:
         text_hash=text_hash,
         matched_patterns=matched_patterns,
         should_block=should_block(screen_type),
-        screenshot_path=image_path,
+        screenshot_path=None,
     )
 
+
+def analyze_screenshot(image: Image, app_hint: str = "", store: bool = True) -> ScreenAnalysis:
+    """
+    Full analysis pipeline: OCR → Classify → Store
+    In-memory frames are only written to disk when they get blocked.
+    """
+    ensure_data_dir()
+
+    # OCR + classify
+    analysis = build_analysis(ocr_image(prepare_for_ocr(image, app_hint)), app_hint)
+
+    if isinstance(image, Frame):
+        if analysis.should_block:
+            analysis.screenshot_path = save_screenshot(image)
+    else:
+        analysis.screenshot_path = image
+
     # Store for learning
-    store_analysis(analysis)
+    if store:
+        store_analysis(analysis)
 
     return analysis
 
 
+# Analyses are stored by a background writer in batches (group commit), off
+# the monitor's decision path. Readers flush it first so they see every row.
+HISTORY_DURABILITY = "periodic"  # none | periodic | batch (see history_store.DURABILITY)
+HISTORY_BATCH_ROWS = 64          # Rows per commit
+HISTORY_BATCH_DELAY = 2.0        # Seconds a row may wait for its batch
+HISTORY_FSYNC_INTERVAL = 30.0    # 'periodic': seconds from a commit to its fsync
+
+_history = None
+
+def get_history_store() -> HistoryStore:
+    global _history
+    if _history is None:
+        ensure_data_dir()
+        _history = HistoryStore(HISTORY_DB, legacy_jsonl=SCREENS_DB, durability=HISTORY_DURABILITY)
+    return _history
+
+
+_history_writer = None
+
+def get_history_writer() -> HistoryWriter:
+    global _history_writer
+    if _history_writer is None:
+        _history_writer = HistoryWriter(get_history_store(), HISTORY_DURABILITY, HISTORY_BATCH_ROWS,
+                                        HISTORY_BATCH_DELAY, HISTORY_FSYNC_INTERVAL)
+        atexit.register(_history_writer.close)
+    return _history_writer
+
+
+def flush_history():
+    """Commit analyses still queued by store_analysis"""
+    if _history_writer is not None:
+        _history_writer.flush()
+
+
+def analysis_row(analysis: ScreenAnalysis) -> dict:
+    """History row for an analysis"""
+    data = asdict(analysis)
+    data['screen_type'] = analysis.screen_type.value
+    return data
+
+
 def store_analysis(analysis: ScreenAnalysis):
-    """Append analysis to JSONL database"""
-    ensure_data_dir()
-    with open(SCREENS_DB, 'a') as f:
-        data = asdict(analysis)
-        data['screen_type'] = analysis.screen_type.value
-        f.write(json.dumps(data) + '\n')
+    """Queue analysis for the history database"""
+    get_history_writer().submit(analysis_row(analysis))
 
 
-def load_history(limit: int = 100) -> List[dict]:
-    """Load recent analysis history"""
-    if not SCREENS_DB.exists():
-        return []
+def load_history(limit: int = 100, app: Optional[str] = None) -> List[dict]:
+    """Load recent analysis history (oldest first)"""
+    flush_history()
+    return get_history_store().recent(limit, app)
 
-    with open(SCREENS_DB, 'r') as f:
-        lines = f.readlines()[-limit:]
 
-    return [json.loads(line) for line in lines if line.strip()]
+def query_history(start: Optional[str] = None, end: Optional[str] = None,
+                  app: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+    """Load history between two ISO timestamps, optionally for one app"""
+    flush_history()
+    return get_history_store().between(start, end, app, limit)
 
 
 def show_stats():
-    """Show classification statistics"""
-    history = load_history(1000)
-    if not history:
+    """Show classification statistics over the whole history"""
+    flush_history()
+    store = get_history_store()
+    total, blocked_total = store.stats('total').get('', (0, 0))
+    if not total:
         print("No history yet. Analyze some screenshots first.")
         return
 
-    print(f"Total screens analyzed: {len(history)}")
+    print(f"Total screens analyzed: {total}")
+    print(f"Blocked: {blocked_total}  Allowed: {total - blocked_total}")
     print()
 
     # Type distribution
-    type_counts = {}
-    for entry in history:
-        st = entry.get('screen_type', 'unknown')
-        type_counts[st] = type_counts.get(st, 0) + 1
-
     print("Screen type distribution:")
-    for st, count in sorted(type_counts.items(), key=lambda x: -x[1]):
-        blocked = "BLOCK" if should_block(ScreenType(st)) else "ALLOW"
-        print(f"  {st:15} {count:4} ({blocked})")
+    for st, (count, _) in sorted(store.stats('type').items(), key=lambda x: -x[1][0]):
+        try:
+            blocked = "BLOCK" if should_block(ScreenType(st)) else "ALLOW"
+        except ValueError:
+            blocked = "?"
+        print(f"  {st:15} {count:6} ({blocked})")
 
     print()
 
     # App distribution
-    app_counts = {}
-    for entry in history:
-        app = entry.get('app_hint', 'unknown') or 'unknown'
-        app_counts[app] = app_counts.get(app, 0) + 1
-
     print("App distribution:")
-    for app, count in sorted(app_counts.items(), key=lambda x: -x[1])[:10]:
-        print(f"  {app:15} {count:4}")
+    for app, (count, blocked) in sorted(store.stats('app').items(), key=lambda x: -x[1][0])[:10]:
+        print(f"  {app or 'unknown':15} {count:6}  ({blocked} blocked)")
 
+    print()
 
-def take_screenshot() -> str:
-    """Take screenshot and return path"""
+    print("Last 14 days:")
+    for day, (count, blocked) in sorted(store.stats('day').items())[-14:]:
+        print(f"  {day:15} {count:6}  ({blocked} blocked)")
+
+    print()
+
+    print("By hour of day:")
+    hours = store.stats('hour')
+    for hour in sorted(hours):
+        count, blocked = hours[hour]
+        print(f"  {hour:>2}:00  {count:6}  ({blocked} blocked)")
+
+
+# Kept screenshots go to a content-addressed store (screenshot_store.py) whose
+# background collector enforces these limits.
+SCREENSHOT_MAX_MB = 2048
+SCREENSHOT_MAX_AGE_DAYS = 30
+
+_screenshot_store = None
+
+def get_screenshot_store() -> ScreenshotStore:
+    global _screenshot_store
+    if _screenshot_store is None:
+        ensure_data_dir()
+        _screenshot_store = ScreenshotStore(DATA_DIR / "screenshots", SCREENSHOT_MAX_MB * 1024 ** 2,
+                                            SCREENSHOT_MAX_AGE_DAYS)
+        _screenshot_store.start()
+        atexit.register(_screenshot_store.stop)
+    return _screenshot_store
+
+
+def _new_screenshot_path() -> Path:
     ensure_data_dir()
     screenshot_dir = DATA_DIR / "screenshots"
     screenshot_dir.mkdir(exist_ok=True)
+    return screenshot_dir / f"screen_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+
+
+def save_screenshot(frame: Frame) -> str:
+    """Persist a captured frame (stored once per distinct content) and return its path"""
+    return get_screenshot_store().put_frame(frame)
+
+
+def capture_screen(region: Optional[Region] = None) -> Image:
+    """
+    Grab the screen (or just `region`) into memory, or fall back to a
+    full-screen screenshot file
+    """
+    backend = get_capture_backend()
+    if backend is not None:
+        return backend.grab(region)
+    return take_screenshot()
 
-    filename = f"screen_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-    path = screenshot_dir / filename
+
+def take_screenshot() -> str:
+    """Take screenshot with a CLI tool and return path"""
+    path = _new_screenshot_path()
+    screenshot_dir = path.parent
 
     # Try different screenshot tools
     for cmd in [
@@ -557,65 +1699,1178 @@ def take_screenshot() -> str:
     raise RuntimeError("No screenshot tool available")
 
 
-def get_active_app() -> str:
-    """Get currently active app name"""
+def get_active_window() -> tuple:
+    """(title, (left, top, width, height) or None) of the focused window"""
     try:
         result = subprocess.run(
-            ['xdotool', 'getactivewindow', 'getwindowname'],
+            ['xdotool', 'getactivewindow', 'getwindowname', 'getwindowgeometry', '--shell'],
             capture_output=True, text=True, timeout=2
         )
         if result.returncode == 0:
-            title = result.stdout.strip()
-            # Extract app hint from window title
-            for app in ['Discord', 'Twitter', 'Instagram', 'Facebook', 'Reddit', 'Slack', 'LinkedIn']:
-                if app.lower() in title.lower():
-                    return app.lower()
-            return title.split(' - ')[-1] if ' - ' in title else title
+            lines = result.stdout.splitlines()
+            title = lines[0].strip() if lines else ""
+            geometry = dict(line.split('=', 1) for line in lines[1:] if '=' in line)
+            try:
+                region = (int(geometry['X']), int(geometry['Y']),
+                          int(geometry['WIDTH']), int(geometry['HEIGHT']))
+            except (KeyError, ValueError):
+                region = None
+            return title, region
     except:
         pass
-    return ""
+    return "", None
+
+
+def get_active_window_title() -> str:
+    """Title of the focused window, '' if unknown"""
+    return get_active_window()[0]
+
 
+def app_from_title(title: str) -> str:
+    """Extract app hint from window title"""
+    for app in ['Discord', 'Twitter', 'Instagram', 'Facebook', 'Reddit', 'Slack', 'LinkedIn']:
+        if app.lower() in title.lower():
+            return app.lower()
+    return title.split(' - ')[-1] if ' - ' in title else title
 
-def monitor_mode(interval: float = 2.0):
+
+def get_active_app() -> str:
+    """Get currently active app name"""
+    return app_from_title(get_active_window_title())
+
+
+# ============ REGIONS OF INTEREST ============
+# The monitor captures only the focused window. For apps listed here it first
+# OCRs a few small regions of that window (as fractions: left, top, width,
+# height) that usually decide the screen type on their own; the whole window
+# is OCR'd only when they are inconclusive.
+
+CAPTURE_ACTIVE_WINDOW = True
+ROI_MIN_CONFIDENCE = 0.7
+ROI_TEMPLATES = {
+    "discord": [
+        (0.0, 0.0, 1.0, 0.08),   # Channel / DM header
+        (0.0, 0.0, 0.22, 1.0),   # Server list + channel sidebar
+    ],
+    "twitter": [
+        (0.25, 0.0, 0.5, 0.12),  # Timeline tabs (For you / Following)
+        (0.0, 0.0, 0.25, 1.0),   # Navigation column
+    ],
+    "instagram": [
+        (0.0, 0.0, 0.2, 1.0),    # Navigation sidebar
+        (0.2, 0.0, 0.8, 0.1),    # Top bar
+    ],
+    "reddit": [
+        (0.0, 0.0, 1.0, 0.12),   # Header with subreddit / feed tabs
+    ],
+}
+
+
+def roi_templates(app_hint: str) -> list:
+    app_lower = app_hint.lower()
+    for app_name, regions in ROI_TEMPLATES.items():
+        if app_name in app_lower:
+            return regions
+    return []
+
+
+def roi_conclusive(text: str, app_hint: str) -> bool:
+    """ROI text decides the screen type (group chats need the full window for mentions)"""
+    screen_type, confidence, _, personal_ping = _classify_content(text, app_hint)
+    return (personal_ping is None and screen_type != ScreenType.UNKNOWN
+            and confidence >= ROI_MIN_CONFIDENCE)
+
+
+def ocr_roi(frame: Frame, app_hint: str) -> Optional[str]:
+    """OCR text of the app's regions of interest if conclusive, else None"""
+    texts = []
+    for left, top, width, height in roi_templates(app_hint):
+        region = (int(left * frame.width), int(top * frame.height),
+                  max(1, int(width * frame.width)), max(1, int(height * frame.height)))
+        text = ocr_image(prepare_for_ocr(frame.crop(region), app_hint))
+        if text:
+            texts.append(text)
+    text = '\n'.join(texts)
+    return text if roi_conclusive(text, app_hint) else None
+
+
+# ============ TILED OCR ============
+# One tesseract call runs on one core. Frames spanning a grid of tiles (4K and
+# multi-monitor screens) are cut into overlapping tiles that are OCR'd side by
+# side on the backend's workers (a worker pool grows to tile_workers() when the
+# first frame is tiled); smaller frames (a maximized 1080p window) keep
+# strip-by-strip OCR and its early exit. Each word is kept by the tile whose
+# core (tile minus overlap) holds its centre, and a text line cut by a vertical
+# tile edge is rejoined with its continuation. Tile results are cached by pixel
+# content, so tiles that didn't change since the last frame skip OCR.
+
+OCR_TILED = True          # Monitor OCRs frames spanning OCR_TILE_MIN_GRID tiles as parallel tiles
+OCR_TILE_SIZE = 1280      # Tile edge in pixels (after preprocessing)
+OCR_TILE_OVERLAP = 64     # Pixels shared by neighbouring tiles so words aren't cut
+OCR_TILE_MIN_GRID = (2, 2)  # Tile rows and columns a frame must span to be tiled...
+OCR_TILE_MIN_WIDTH = 3840   # ...unless it is wider than a 4K screen (side-by-side monitors)
+OCR_TILE_WORKERS = 0      # Tiles OCR'd at once; 0 = one per core, leaving one core free
+OCR_TILE_CACHE_SIZE = 256  # Tile results kept for unchanged tiles
+
+
+def tile_workers() -> int:
+    return OCR_TILE_WORKERS or max(1, (os.cpu_count() or 2) - 1)
+
+
+def tile_grid(width: int, height: int, size: int = OCR_TILE_SIZE,
+              overlap: int = OCR_TILE_OVERLAP) -> List[tuple]:
+    """(row, col, tile region, core region) for equal tiles covering the frame, row-major"""
+    rows, cols = max(1, -(-height // size)), max(1, -(-width // size))
+    tile_h, tile_w = -(-height // rows), -(-width // cols)
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            core = (col * tile_w, row * tile_h,
+                    min(tile_w, width - col * tile_w), min(tile_h, height - row * tile_h))
+            left, top = max(0, core[0] - overlap), max(0, core[1] - overlap)
+            right = min(width, core[0] + core[2] + overlap)
+            bottom = min(height, core[1] + core[3] + overlap)
+            tiles.append((row, col, (left, top, right - left, bottom - top), core))
+    return tiles
+
+
+def use_tiles(frame: Frame, backend: OCRBackend) -> bool:
+    if not (OCR_TILED and backend.concurrent and tile_workers() > 1):
+        return False
+    rows, cols = -(-frame.height // OCR_TILE_SIZE), -(-frame.width // OCR_TILE_SIZE)
+    min_rows, min_cols = OCR_TILE_MIN_GRID
+    return (rows >= min_rows and cols >= min_cols) or (frame.width > OCR_TILE_MIN_WIDTH and cols > 1)
+
+
+class TileCache:
+    """Tesseract TSV of recently OCR'd tiles, keyed by their pixels"""
+
+    def __init__(self, max_entries: int = OCR_TILE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(tile: Frame) -> tuple:
+        return (tile.width, tile.height, tile.mode, hashlib.blake2b(tile.data, digest_size=16).digest())
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            tsv = self._entries.get(key)
+            if tsv is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return tsv
+
+    def add(self, key: tuple, tsv: str):
+        with self._lock:
+            self._entries[key] = tsv
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_tile_cache = None
+
+def get_tile_cache() -> TileCache:
+    global _tile_cache
+    if _tile_cache is None:
+        _tile_cache = TileCache()
+    return _tile_cache
+
+
+def _line_centre(word: OCRWord) -> float:
+    return word.top + word.height / 2
+
+
+def _continued_line(candidates: List[list], line: list) -> Optional[list]:
+    """The line of the left neighbour tile that `line` continues, if any"""
+    first = line[0]
+    for candidate in candidates:
+        last = max(candidate, key=lambda w: w.left + w.width)
+        height = max(last.height, first.height)
+        # Ordinary word spacing, and on the same baseline
+        gap = first.left - (last.left + last.width)
+        if -height <= gap <= 2 * height and abs(_line_centre(last) - _line_centre(first)) <= height / 2:
+            return candidate
+    return None
+
+
+def merge_tile_words(tiles: List[tuple]) -> List[OCRWord]:
+    """
+    Words of (row, col, words) tiles in reading order: tile rows top to
+    bottom, tiles left to right, and lines cut by a tile edge joined back up.
+    """
+    lines = []
+    tile_lines = {}  # (row, col) -> output lines holding that tile's words
+    for row, col, words in tiles:
+        own = []
+        for word in words:
+            if own and own[-1][-1].line == word.line:
+                own[-1].append(word)
+            else:
+                own.append([word])
+
+        left_lines = tile_lines.get((row, col - 1), [])
+        tile_lines[(row, col)] = placed = []
+        for line in own:
+            target = _continued_line(left_lines, line) if left_lines else None
+            if target is None:
+                lines.append(line)
+                placed.append(line)
+            else:
+                for word in line:
+                    word.line = target[0].line
+                target.extend(line)
+                placed.append(target)
+    return [word for line in lines for word in line]
+
+
+def ocr_tiled(frame: Frame, tile_size: int = OCR_TILE_SIZE, workers: Optional[int] = None,
+              use_cache: bool = True) -> str:
+    """OCR a frame as overlapping tiles in parallel; unchanged tiles come from the cache"""
+    return words_to_text(ocr_tiled_words(frame, tile_size, workers, use_cache))
+
+
+def ocr_tiled_words(frame: Frame, tile_size: int = OCR_TILE_SIZE, workers: Optional[int] = None,
+                    use_cache: bool = True) -> List[OCRWord]:
+    """ocr_tiled, returning the words in reading order"""
+    backend = get_ocr_backend()
+    cache = get_tile_cache()
+    grid = tile_grid(frame.width, frame.height, tile_size)
+
+    tsvs, pending = [None] * len(grid), []
+    for i, (_, _, region, _) in enumerate(grid):
+        tile = frame.crop(region)
+        key = TileCache.key(tile) if use_cache else None
+        tsvs[i] = cache.get(key) if use_cache else None
+        if tsvs[i] is None:
+            pending.append((i, tile, key))
+
+    if pending:
+        workers = workers or tile_workers()
+        if isinstance(backend, TesseractPool):
+            backend.grow(workers)
+        if not backend.concurrent:
+            workers = 1
+        with ThreadPoolExecutor(max_workers=min(workers, len(pending)),
+                                thread_name_prefix="ocr-tile") as executor:
+            results = executor.map(lambda job: backend.ocr_tsv(job[1]), pending)
+            for (i, _, key), tsv in zip(pending, results):
+                tsvs[i] = tsv
+                # An empty result may be an OCR error: don't remember it
+                if use_cache and tsv:
+                    cache.add(key, tsv)
+
+    tiles = []
+    for (row, col, region, core), tsv in zip(grid, tsvs):
+        left, top, width, height = core
+        words = [w for w in parse_tsv(tsv, region[1], region[0])
+                 if top <= w.top + w.height // 2 < top + height
+                 and left <= w.left + w.width // 2 < left + width]
+        tiles.append((row, col, words))
+    return merge_tile_words(tiles)
+
+
+# ============ FRAME DEDUPE ============
+# Frames whose perceptual hash is within FRAME_HASH_DISTANCE bits of a recent
+# frame (same app and window title) reuse that frame's analysis instead of
+# running OCR again. The hash is too coarse to see text changes, so the title
+# tells apart channels and timelines with the same layout. Cached decisions
+# are forgotten when the patterns or the learned model change.
+
+FRAME_CACHE_SIZE = 64
+FRAME_HASH_DISTANCE = 6  # Of 256 bits
+
+
+class FrameCache:
+    """Bounded LRU of (app_hint, window title, frame fingerprint) -> ScreenAnalysis"""
+
+    def __init__(self, max_entries: int = FRAME_CACHE_SIZE, max_distance: int = FRAME_HASH_DISTANCE):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._entries: OrderedDict = OrderedDict()
+        self._classifier = None  # (compiled patterns, learned model) the entries came from
+        self.hits = 0
+        self.misses = 0
+
+    def _check_classifier(self):
+        """Drop every entry once patterns were reloaded or the learned model changed"""
+        classifier = (_compiled, _learned_model)
+        if self._classifier is None or any(a is not b for a, b in zip(classifier, self._classifier)):
+            self._entries.clear()
+            self._classifier = classifier
+
+    def lookup(self, fingerprint: int, app_hint: str, window_title: str) -> Optional[ScreenAnalysis]:
+        """Return the analysis of the closest cached frame, if close enough"""
+        self._check_classifier()
+        best_key, best_distance = None, self.max_distance + 1
+        for key in self._entries:
+            if key[:2] != (app_hint, window_title):
+                continue
+            distance = bin(key[2] ^ fingerprint).count('1')
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+                if distance == 0:
+                    break
+
+        if best_key is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key]
+
+    def add(self, fingerprint: int, app_hint: str, window_title: str, analysis: ScreenAnalysis):
+        # Ping-window decisions expire, so they can't be replayed
+        if any(p.startswith("ping_window_active") for p in analysis.matched_patterns):
+            return
+        self._check_classifier()
+        key = (app_hint, window_title, fingerprint)
+        self._entries[key] = analysis
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# ============ ADAPTIVE SAMPLING ============
+# The monitor samples fast right after the focused window changes and backs
+# off while the decision stays the same. The CPU governor keeps the monitor,
+# OCR processes included, under a budget: it first OCRs frames at half
+# resolution, then samples less often, and steps back once usage drops.
+# Together they never wait longer than MONITOR_MAX_INTERVAL, and while
+# waiting the focused window's title is checked so a switch is captured at once.
+
+MONITOR_MIN_INTERVAL = 0.5   # Seconds, right after a window/title change
+MONITOR_MAX_INTERVAL = 10.0  # Seconds, ceiling while nothing changes
+MONITOR_BACKOFF = 1.5        # Interval growth per unchanged decision
+MONITOR_FAST_SAMPLES = 3     # Samples taken at MONITOR_MIN_INTERVAL after a change
+MONITOR_CPU_BUDGET = 0.15    # Fraction of one core; 0 disables the governor
+MONITOR_CPU_WINDOW = 30.0    # Seconds averaged over
+MONITOR_TITLE_POLL = 1.0     # Seconds between title checks while waiting for the next capture
+
+# Governor levels: (OCR downscale factor, interval multiplier)
+GOVERNOR_LEVELS = [(1, 1.0), (2, 1.0), (2, 2.0), (2, 4.0)]
+
+
+class SamplingScheduler:
+    """Picks the delay before the next capture"""
+
+    def __init__(self, base_interval: float, min_interval: float = MONITOR_MIN_INTERVAL,
+                 max_interval: float = MONITOR_MAX_INTERVAL):
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        self.max_interval = max(max_interval, base_interval)
+        self.interval = base_interval
+        self._fast_samples = 0
+        self._last_title = None
+        self._last_decision = None
+
+    def on_capture(self, window_title: str):
+        if self._last_title is not None and window_title != self._last_title:
+            self._fast_samples = MONITOR_FAST_SAMPLES
+            self.interval = self.base_interval
+        self._last_title = window_title
+
+    def on_decision(self, analysis: ScreenAnalysis):
+        decision = (analysis.app_hint, analysis.screen_type, analysis.should_block)
+        if decision == self._last_decision:
+            self.interval = min(self.interval * MONITOR_BACKOFF, self.max_interval)
+        else:
+            self.interval = self.base_interval
+        self._last_decision = decision
+
+    def next_delay(self, factor: float = 1.0) -> float:
+        """Delay before the next capture, stretched by factor up to max_interval"""
+        interval = self.interval
+        if self._fast_samples:
+            self._fast_samples -= 1
+            interval = self.min_interval
+        return min(interval * factor, self.max_interval)
+
+
+def monitor_cpu_seconds() -> float:
+    """CPU used so far by this process, its reaped children and live OCR workers"""
+    t = os.times()
+    return (t.user + t.system + t.children_user + t.children_system +
+            get_ocr_backend().cpu_seconds())
+
+
+class CPUGovernor:
+    """Steps OCR resolution and sampling rate down while over the CPU budget"""
+
+    def __init__(self, budget: float = MONITOR_CPU_BUDGET, window: float = MONITOR_CPU_WINDOW):
+        self.budget = budget
+        self.window = window
+        self.level = 0
+        self.usage = 0.0
+        self._samples = deque()  # (monotonic, cpu seconds)
+        self._changed_at = time.monotonic()
+
+    @property
+    def ocr_scale(self) -> int:
+        return GOVERNOR_LEVELS[self.level][0]
+
+    @property
+    def interval_factor(self) -> float:
+        return GOVERNOR_LEVELS[self.level][1]
+
+    def update(self):
+        if self.budget <= 0:
+            return
+        now = time.monotonic()
+        self._samples.append((now, monitor_cpu_seconds()))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+        (start, start_cpu), (_, cpu) = self._samples[0], self._samples[-1]
+        if now - start < self.window / 2:
+            return  # Not enough history yet
+        self.usage = (cpu - start_cpu) / (now - start)
+
+        # Give the previous step a full window to show its effect
+        if now - self._changed_at < self.window:
+            return
+        level = self.level
+        if self.usage > self.budget and level < len(GOVERNOR_LEVELS) - 1:
+            level += 1
+        elif self.usage < self.budget / 2 and level > 0:
+            level -= 1
+        if level != self.level:
+            self.level = level
+            self._changed_at = now
+            print(f"[Governor] CPU {self.usage:.0%} (budget {self.budget:.0%}) -> "
+                  f"OCR scale 1/{self.ocr_scale}, interval x{self.interval_factor:g}",
+                  file=sys.stderr)
+
+
+# ============ DIRTY REGIONS ============
+# When X11 damage says only part of the window was redrawn, the monitor OCRs
+# just the redrawn band (full width, so lines aren't cut sideways) and keeps
+# the previous words everywhere else. Word boxes are kept in screen
+# coordinates so bands from different frames line up.
+
+DIRTY_MAX_SHARE = 0.5  # Redraws covering more of the window's height OCR the whole window
+DIRTY_MARGIN = 32      # Screen pixels read around a band, so lines it cuts are read whole
+
+_ocr_calls = itertools.count()
+
+
+def screen_words(words: List[OCRWord], frame: Frame) -> List[OCRWord]:
+    """Words OCR'd from frame, with boxes in screen coordinates"""
+    call = next(_ocr_calls)  # Keeps line ids of separate OCR runs apart
+    scale = frame.scale
+    return [OCRWord(w.text, w.conf, (call,) + w.line, frame.top + w.top * scale, w.height * scale,
+                    frame.left + w.left * scale, w.width * scale)
+            for w in words]
+
+
+def merge_dirty(a: Optional[List[Region]], b: Optional[List[Region]]) -> Optional[List[Region]]:
+    """Dirty rects of two consecutive frames; None (unknown) wins"""
+    if a is None or b is None:
+        return None
+    rects = list(a)
+    for rect in b:
+        merge_rect(rects, rect)
+    return rects
+
+
+def dirty_band(rects: List[Region], frame: Frame) -> Optional[tuple]:
+    """Screen rows (top, bottom) covering the rects that touch frame, None if none do"""
+    bounds = (frame.left, frame.top, frame.width * frame.scale, frame.height * frame.scale)
+    clipped = [r for r in (clip_region(rect, bounds) for rect in rects) if r]
+    if not clipped:
+        return None
+    return min(r[1] for r in clipped), max(r[1] + r[3] for r in clipped)
+
+
+def merge_band_words(previous: List[OCRWord], band: List[OCRWord], top: int, bottom: int) -> List[OCRWord]:
+    """Previous words outside screen rows [top, bottom), band words inside, lines top to bottom"""
+    kept = [w for w in previous if not top <= _line_centre(w) < bottom]
+    kept += [w for w in band if top <= _line_centre(w) < bottom]
+    lines: OrderedDict = OrderedDict()
+    for word in kept:
+        lines.setdefault(word.line, []).append(word)
+    ordered = sorted(lines.values(), key=lambda line: min(w.top for w in line))
+    return [word for line in ordered for word in line]
+
+
+def ocr_band(frame: Frame, top: int, bottom: int, app_hint: str, scale: int = 1) -> List[OCRWord]:
+    """Screen-coordinate words of frame rows covering screen rows [top, bottom) plus the margin"""
+    y0 = max(0, (top - DIRTY_MARGIN - frame.top) // frame.scale)
+    y1 = min(frame.height, -(-(bottom + DIRTY_MARGIN - frame.top) // frame.scale))
+    band = frame.crop((0, y0, frame.width, y1 - y0))
+    if scale > 1:
+        band = band.downscale(scale)
+    band = prepare_for_ocr(band, app_hint)
+    return screen_words(parse_tsv(get_ocr_backend().ocr_tsv(band)), band)
+
+
+# ============ MONITOR PIPELINE ============
+# Capture, OCR, classification and persistence run as concurrent stages joined
+# by bounded queues. Capture keeps its own clock; when a later stage is busy,
+# the frame waiting for it is replaced by the newest one (latest wins), so a
+# slow OCR never builds a backlog of stale screens.
+#
+# With X11 DAMAGE events available, capture waits for the screen to change
+# instead of keeping a clock: redraws outside the captured window are ignored,
+# focus/title changes are captured at once, and a slow safety poll catches
+# anything the events miss.
+
+MONITOR_STATS_INTERVAL = 60.0  # Seconds between latency summaries
+EVENT_SAFETY_POLL = 30.0       # Seconds without a relevant event before capturing anyway
+EVENT_DEBOUNCE = 0.03          # Let a burst of redraws settle before capturing
+EVENT_MIN_SPACING = 0.5        # Seconds between damage-triggered captures
+NEAR_DUP_THRESHOLD = 0.9       # Estimated shingle Jaccard similarity
+NEAR_DUP_WINDOW = 256          # Recent texts kept in the near-duplicate index
+
+
+class StageStats:
+    """Latency counters for one pipeline stage"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+        self.dropped = 0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def avg(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> str:
+        return (f"n={self.count} avg={self.avg * 1000:.0f}ms last={self.last * 1000:.0f}ms "
+                f"max={self.max * 1000:.0f}ms dropped={self.dropped}")
+
+
+@dataclass
+class FrameJob:
+    """A captured frame moving through the pipeline"""
+    captured_at: float  # time.monotonic() when capture started
+    image: Image
+    app_hint: str
+    window_title: str = ""
+    region: Optional[Region] = None  # Captured area, None for the whole screen
+    dirty: Optional[List[Region]] = None  # Screen rects redrawn since the previous capture, None if unknown
+    fingerprint: Optional[int] = None
+    raw_text: str = ""
+    analysis: Optional[ScreenAnalysis] = None
+
+    def discard(self):
+        """Frame dropped or finished without being kept"""
+        if isinstance(self.image, str):
+            try:
+                os.remove(self.image)
+            except OSError:
+                pass
+
+
+class MonitorPipeline:
+    STAGES = ("capture", "roi", "preprocess", "ocr", "classify", "persist", "decision")
+
+    def __init__(self, interval: float = 2.0, cpu_budget: float = MONITOR_CPU_BUDGET):
+        self.interval = interval
+        self.scheduler = SamplingScheduler(interval)
+        self.governor = CPUGovernor(cpu_budget)
+        self.frame_cache = FrameCache()
+        self.near_duplicates = NearDuplicateIndex(NEAR_DUP_THRESHOLD, NEAR_DUP_WINDOW)
+        self.early_exits = 0
+        self.roi_decided = 0
+        self.dirty_ocr = 0
+        # (app_hint, region, screen words) of the last frame OCR'd completely,
+        # and dirty rects of frames since then that were not OCR'd
+        self._words: Optional[tuple] = None
+        self._carried: List[Region] = []
+        self.stats = {name: StageStats() for name in self.STAGES}
+        self.last_hash = None
+        self.events = None
+        self.event_captures = {'damage': 0, 'focus': 0, 'poll': 0}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._urgent = False
+        self.persist_queue: Optional[asyncio.Queue] = None
+        # Capture backends must stay on the thread that created them
+        self._capture_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+
+    async def run(self):
+        self.ocr_queue = asyncio.Queue(maxsize=1)
+        self.classify_queue = asyncio.Queue(maxsize=1)
+        self.persist_queue = asyncio.Queue(maxsize=100)
+        await asyncio.gather(
+            self._capture_stage(),
+            self._ocr_stage(),
+            self._classify_stage(),
+            self._persist_stage(),
+            self._stats_reporter(),
+        )
+
+    def _put_latest(self, q: asyncio.Queue, job: FrameJob, stage: str):
+        """Queue job, replacing a stale one that is still waiting"""
+        if q.full():
+            stale = q.get_nowait()
+            stale.discard()
+            self.stats[stage].dropped += 1
+            job.dirty = merge_dirty(stale.dirty, job.dirty)
+        q.put_nowait(job)
+
+    def _capture(self) -> FrameJob:
+        captured_at = time.monotonic()
+        title, region = get_active_window()
+        image = capture_screen(region if CAPTURE_ACTIVE_WINDOW else None)
+        job = FrameJob(captured_at, image, app_from_title(title), title,
+                       region if CAPTURE_ACTIVE_WINDOW else None)
+        if isinstance(image, Frame):
+            job.fingerprint = frame_fingerprint(image)
+        return job
+
+    def _on_screen_event(self, kind: str):
+        """Runs on the event loop, scheduled from the X11 event thread"""
+        if kind == 'focus':
+            self._urgent = True
+        self._wakeup.set()
+
+    async def _wait_for_change(self, last: Optional[FrameJob], started: float) -> str:
+        """Sleep until the screen changed where it matters; returns the reason"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), EVENT_SAFETY_POLL)
+            except asyncio.TimeoutError:
+                return 'poll'
+            self._wakeup.clear()
+            if self._urgent:
+                await asyncio.sleep(EVENT_DEBOUNCE)
+                return 'focus'
+            # Redraws elsewhere (clocks, other monitors, background windows)
+            if last is not None and last.region is not None and \
+                    not self.events.dirty_intersects(last.region):
+                continue
+            spacing = EVENT_MIN_SPACING * self.governor.interval_factor
+            await asyncio.sleep(max(EVENT_DEBOUNCE, spacing - (time.monotonic() - started)))
+            return 'damage'
+
+    async def _capture_stage(self):
+        loop = asyncio.get_running_loop()
+        capture = await loop.run_in_executor(self._capture_executor, get_capture_backend)
+        print(f"Capture: {capture.name if capture else 'screenshot tool (disk)'}")
+        self._wakeup = asyncio.Event()
+        self.events = get_screen_events(
+            lambda kind: loop.call_soon_threadsafe(self._on_screen_event, kind))
+        if self.events is not None:
+            self.events.start()
+            print(f"Capturing on screen changes (safety poll every {EVENT_SAFETY_POLL:.0f}s)")
+
+        last, reason = None, None
+        while True:
+            started = time.monotonic()
+            try:
+                # Damage reported from here on belongs to the next capture
+                self._wakeup.clear()
+                self._urgent = False
+                dirty = self.events.take_dirty() if self.events is not None else None
+                job = await loop.run_in_executor(self._capture_executor, self._capture)
+                # Focus changes and the safety poll (damage may have been missed) read everything
+                job.dirty = dirty if reason == 'damage' else None
+                self.stats["capture"].record(time.monotonic() - started)
+                self.scheduler.on_capture(job.window_title)
+                self._put_latest(self.ocr_queue, job, "ocr")
+                last = job
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+            self.governor.update()
+            if self.events is not None:
+                reason = await self._wait_for_change(last, started)
+                self.event_captures[reason] += 1
+                continue
+            delay = self.scheduler.next_delay(self.governor.interval_factor)
+            await self._wait_for_title_change(loop, last, started + delay)
+
+    async def _wait_for_title_change(self, loop, last: Optional[FrameJob], until: float):
+        """Sleep until `until`, returning early once the focused window's title changes"""
+        while True:
+            remaining = until - time.monotonic()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, MONITOR_TITLE_POLL))
+            if last is None or time.monotonic() >= until:
+                continue
+            title = await loop.run_in_executor(self._capture_executor, get_active_window_title)
+            # The capture that follows resets the scheduler (on_capture)
+            if title and title != last.window_title:
+                return
+
+    async def _ocr_stage(self):
+        while True:
+            job = await self.ocr_queue.get()
+            try:
+                # Near-identical frame analyzed recently: reuse its decision
+                if job.fingerprint is not None:
+                    cached = self.frame_cache.lookup(job.fingerprint, job.app_hint, job.window_title)
+                    if cached is not None:
+                        self._carry_dirty(job)
+                        job.analysis = cached
+                        self._decide(job)
+                        continue
+
+                image, text, words = job.image, None, None
+                if isinstance(image, Frame):
+                    words = await self._ocr_dirty(job)
+                    if words is not None:
+                        text = words_to_text(words)
+                    elif self.governor.ocr_scale > 1:
+                        image = image.downscale(self.governor.ocr_scale)
+
+                    # Small regions first; the whole window only if they don't decide
+                    if text is None and roi_templates(job.app_hint):
+                        started = time.monotonic()
+                        text = await asyncio.to_thread(ocr_roi, image, job.app_hint)
+                        self.stats["roi"].record(time.monotonic() - started)
+                        self.roi_decided += text is not None
+
+                    if text is None:
+                        started = time.monotonic()
+                        image = await asyncio.to_thread(prepare_for_ocr, image, job.app_hint)
+                        self.stats["preprocess"].record(time.monotonic() - started)
+
+                if text is None:
+                    started = time.monotonic()
+                    if OCR_STREAMING:
+                        words, early = await asyncio.to_thread(ocr_streaming_words, image, job.app_hint)
+                        text = words_to_text(words)
+                        self.early_exits += early
+                        # Only a complete read can stand in for unchanged parts later
+                        words = screen_words(words, image) if isinstance(image, Frame) and not early else None
+                    else:
+                        text = await asyncio.to_thread(ocr_image, image)
+                    self.stats["ocr"].record(time.monotonic() - started)
+
+                self._words = (job.app_hint, job.region, words) if words is not None else None
+                self._carried = []
+                job.raw_text = text
+                self._put_latest(self.classify_queue, job, "classify")
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+                self._words = None
+                job.discard()
+
+    def _carry_dirty(self, job: FrameJob):
+        """Frame skipped OCR: its redraws still count against the kept words"""
+        if self._words is None:
+            return
+        if job.dirty is None:
+            self._words = None
+        else:
+            self._carried = merge_dirty(self._carried, job.dirty)
+
+    async def _ocr_dirty(self, job: FrameJob) -> Optional[List[OCRWord]]:
+        """Screen words with only the redrawn band re-read, None if the whole window must be"""
+        if job.dirty is None or self._words is None:
+            return None
+        app_hint, region, previous = self._words
+        if (app_hint, region) != (job.app_hint, job.region):
+            return None
+        frame = job.image
+        band = dirty_band(merge_dirty(self._carried, job.dirty), frame)
+        if band is None:
+            return previous  # Redraws were all outside the window
+        top, bottom = band
+        if bottom - top > DIRTY_MAX_SHARE * frame.height * frame.scale:
+            return None
+
+        started = time.monotonic()
+        band_words = await asyncio.to_thread(ocr_band, frame, top, bottom, app_hint,
+                                             self.governor.ocr_scale)
+        self.stats["ocr"].record(time.monotonic() - started)
+        self.dirty_ocr += 1
+        return merge_band_words(previous, band_words, top, bottom)
+
+    async def _classify_stage(self):
+        while True:
+            job = await self.classify_queue.get()
+            try:
+                started = time.monotonic()
+                job.analysis, duplicate = await asyncio.to_thread(self._classify, job)
+                self.stats["classify"].record(time.monotonic() - started)
+                if job.fingerprint is not None:
+                    self.frame_cache.add(job.fingerprint, job.app_hint, job.window_title, job.analysis)
+                self._decide(job)
+                if duplicate:
+                    job.discard()
+                    continue
+                # History must not lose rows, so this one waits instead of dropping
+                await self.persist_queue.put(job)
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+                job.discard()
+
+    def _classify(self, job: FrameJob) -> tuple:
+        """
+        (analysis, duplicate). Text that is a near-duplicate of a recent one
+        reuses its analysis and gets no history row. Group chats are always
+        reclassified (a near-identical chat may have gained a mention); they
+        only count as duplicates if the decision didn't change.
+        """
+        signature = minhash(job.raw_text)
+        previous = self.near_duplicates.find(signature, job.app_hint)
+        if previous is not None and not any(p.startswith(GROUP_CHAT_PATTERNS)
+                                            for p in previous.matched_patterns):
+            return previous, True
+
+        analysis = build_analysis(job.raw_text, job.app_hint)
+        if previous is not None and (previous.screen_type, previous.should_block) == \
+                (analysis.screen_type, analysis.should_block):
+            return previous, True
+        self.near_duplicates.add(signature, analysis, job.app_hint)
+        return analysis, False
+
+    def _persist(self, job: FrameJob):
+        analysis = job.analysis
+        if analysis.should_block:
+            if isinstance(job.image, Frame):
+                analysis.screenshot_path = save_screenshot(job.image)
+            else:
+                analysis.screenshot_path = get_screenshot_store().put_file(job.image)
+        else:
+            job.discard()
+        store_analysis(analysis)
+
+    async def _persist_stage(self):
+        while True:
+            job = await self.persist_queue.get()
+            try:
+                started = time.monotonic()
+                await asyncio.to_thread(self._persist, job)
+                self.stats["persist"].record(time.monotonic() - started)
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+
+    def drain(self):
+        """Persist jobs still queued when the event loop stopped (before the history writer closes)"""
+        while self.persist_queue is not None and not self.persist_queue.empty():
+            job = self.persist_queue.get_nowait()
+            try:
+                self._persist(job)
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+
+    def _decide(self, job: FrameJob):
+        """Block decision is known - report it"""
+        self.stats["decision"].record(time.monotonic() - job.captured_at)
+        analysis = job.analysis
+        self.scheduler.on_decision(analysis)
+
+        # Only report if screen changed
+        if analysis.text_hash != self.last_hash:
+            self.last_hash = analysis.text_hash
+
+            status = "BLOCKED" if analysis.should_block else "allowed"
+            print(f"[{analysis.timestamp[11:19]}] {job.app_hint or 'unknown':12} "
+                  f"{analysis.screen_type.value:12} ({analysis.confidence:.0%}) -> {status}")
+
+            if analysis.matched_patterns:
+                print(f"           Patterns: {', '.join(analysis.matched_patterns[:3])}")
+
+    async def _stats_reporter(self):
+        while True:
+            await asyncio.sleep(MONITOR_STATS_INTERVAL)
+            self.print_stats()
+
+    def print_stats(self):
+        print("Stage latencies:")
+        for name in self.STAGES:
+            print(f"  {name:10} {self.stats[name].summary()}")
+        frames = self.frame_cache.hits + self.frame_cache.misses
+        if frames:
+            print(f"  Unchanged frames skipped: {self.frame_cache.hits}/{frames}")
+        if self.stats["roi"].count:
+            print(f"  Decided from regions of interest: {self.roi_decided}/{self.stats['roi'].count}")
+        if self.early_exits:
+            print(f"  OCR stopped early: {self.early_exits}/{self.stats['ocr'].count}")
+        if self.dirty_ocr:
+            print(f"  OCR of redrawn bands only: {self.dirty_ocr}/{self.stats['ocr'].count}")
+        tiles = get_tile_cache()
+        if tiles.hits + tiles.misses:
+            print(f"  Unchanged tiles skipped: {tiles.hits}/{tiles.hits + tiles.misses}")
+        texts = self.near_duplicates.hits + self.near_duplicates.misses
+        if texts:
+            print(f"  Near-duplicate texts (no new row): {self.near_duplicates.hits}/{texts}")
+        cache = get_classification_cache()
+        if cache.hits + cache.misses:
+            print(f"  Classification cache hits: {cache.hits}/{cache.hits + cache.misses}")
+        if _screenshot_store is not None and _screenshot_store.stored + _screenshot_store.deduplicated:
+            shots = _screenshot_store
+            print(f"  Screenshots kept: {shots.stored} new, {shots.deduplicated} already stored, "
+                  f"{shots.collected} collected")
+        writer = _history_writer
+        if writer is not None and writer.rows_written:
+            print(f"  History: {writer.rows_written} rows in {writer.commits} commits "
+                  f"({writer.checkpoints} fsyncs, durability {writer.durability})")
+        if _pattern_watcher is not None and _pattern_watcher.reloads + _pattern_watcher.rejected:
+            config = _pattern_watcher
+            print(f"  Pattern config: version {config.version}, {config.reloads} reloads "
+                  f"(last {config.last_latency * 1000:.1f}ms), {config.rejected} rejected")
+        if self.events is not None:
+            captures = ", ".join(f"{kind} {n}" for kind, n in self.event_captures.items())
+            print(f"  Event-triggered captures: {captures} ({self.events.events} X11 events)")
+        interval = min(self.scheduler.interval * self.governor.interval_factor, self.scheduler.max_interval)
+        print(f"  Interval {interval:.1f}s, "
+              f"CPU {self.governor.usage:.0%} (governor level {self.governor.level})")
+
+    def close(self):
+        if self.events is not None:
+            self.events.stop()
+        self._capture_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def monitor_mode(interval: float = 2.0, cpu_budget: float = MONITOR_CPU_BUDGET):
     """Continuous monitoring mode"""
     print("TotalControl Screen Monitor")
-    print(f"Checking every {interval}s - Press Ctrl+C to stop")
+    print(f"Checking every {interval}s (adaptive {min(MONITOR_MIN_INTERVAL, interval)}-"
+          f"{max(MONITOR_MAX_INTERVAL, interval)}s), CPU budget {cpu_budget:.0%} - Press Ctrl+C to stop")
+    # The capture backend is created by the pipeline, on its capture thread
+    print(f"OCR backend: {get_ocr_backend().name}")
     print("-" * 50)
 
-    last_hash = None
+    watch_pattern_config()
+    # Service managers stop the monitor with SIGTERM: shut down as on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    pipeline = MonitorPipeline(interval, cpu_budget)
+    try:
+        asyncio.run(pipeline.run())
+    except KeyboardInterrupt:
+        print("\nMonitor stopped")
+        pipeline.print_stats()
+    finally:
+        # Analyses waiting for the persist stage still go to history (closed at exit)
+        pipeline.drain()
+        pipeline.close()
+
+
+# ============ BATCH MODE ============
+# Re-score a directory (or glob) of saved screenshots on a process pool. A
+# batch is the patterns and app hint images are scored with; each stored row
+# is tagged with its batch_id and marks its image done in the same
+# transaction, so a rerun (interrupted, or with new images added) scores only
+# images the batch hasn't. Changing the patterns starts a new batch. Batch rows
+# are re-scores, not screens seen: --stats and --learn leave them out.
+
+BATCH_EXTENSIONS = ('.png', '.webp', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.pnm', '.ppm')
+BATCH_COMMIT_EVERY = 50  # Images per history transaction
+
+
+def _batch_worker_init():
+    """Per-process setup: one OCR engine, single-threaded so processes don't oversubscribe"""
+    global _ocr_backend
+    # Ctrl+C reaches the whole process group; only the parent handles it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    try:
+        _ocr_backend = InProcessOCR()
+    except Exception:
+        _ocr_backend = SubprocessOCR()
 
-    while True:
-        try:
-            # Take screenshot
-            screenshot_path = take_screenshot()
-            app_hint = get_active_app()
 
-            # Analyze
-            analysis = analyze_screenshot(screenshot_path, app_hint)
+def _batch_analyze(job: tuple) -> dict:
+    path, app_hint, batch_id = job
+    row = analysis_row(analyze_screenshot(path, app_hint, store=False))
+    row['batch_id'] = batch_id
+    return row
 
-            # Only report if screen changed
-            if analysis.text_hash != last_hash:
-                last_hash = analysis.text_hash
 
-                status = "BLOCKED" if analysis.should_block else "allowed"
-                print(f"[{analysis.timestamp[11:19]}] {app_hint or 'unknown':12} "
-                      f"{analysis.screen_type.value:12} ({analysis.confidence:.0%}) -> {status}")
+def _batch_paths(source: str) -> List[str]:
+    """Image files matching a glob, or anywhere under a directory (the screenshot store nests them)"""
+    if os.path.isdir(source):
+        candidates = Path(source).rglob('*')
+    else:
+        candidates = map(Path, glob.glob(source, recursive=True))
+    return sorted(str(p) for p in candidates if p.suffix.lower() in BATCH_EXTENSIONS and p.is_file())
 
-                if analysis.matched_patterns:
-                    print(f"           Patterns: {', '.join(analysis.matched_patterns[:3])}")
 
-            # Cleanup old screenshots
-            if not analysis.should_block:
-                os.remove(screenshot_path)
+def _batch_id(app_hint: str) -> str:
+    digest = hashlib.sha1(json.dumps([*get_compiled_patterns().tables, app_hint]).encode())
+    return digest.hexdigest()[:16]
 
-            time.sleep(interval)
 
-        except KeyboardInterrupt:
-            print("\nMonitor stopped")
-            break
-        except Exception as e:
-            print(f"Error: {e}", file=sys.stderr)
-            time.sleep(interval)
+def batch_mode(source: str, app_hint: str = "", workers: Optional[int] = None):
+    """Analyze every image under source in parallel, streaming rows to history"""
+    paths = [os.path.abspath(path) for path in _batch_paths(source)]
+    if not paths:
+        print(f"No images found for {source}")
+        return
+
+    store = get_history_store()
+    batch_id = _batch_id(app_hint)
+    scored = store.batch_items(batch_id)
+    todo = [path for path in paths if path not in scored]
+    done = len(paths) - len(todo)
+    if not todo:
+        print(f"Batch {batch_id} already complete ({len(paths)} images)")
+        return
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Batch {batch_id}: {len(paths)} images, {workers} workers"
+          + (f", {done} already scored" if done else ""))
+
+    ctx = multiprocessing.get_context('spawn')
+    pool = ctx.Pool(workers, initializer=_batch_worker_init)
+    jobs = [(path, app_hint, batch_id) for path in todo]
+    start = time.time()
+    processed = 0
+    pending = []
+
+    def commit():
+        store.append_many(pending, items=(batch_id, todo[processed - len(pending):processed]))
+        pending.clear()
+
+    try:
+        for row in pool.imap(_batch_analyze, jobs):
+            pending.append(row)
+            processed += 1
+            if len(pending) >= BATCH_COMMIT_EVERY:
+                commit()
+                rate = processed / (time.time() - start)
+                print(f"  {done + processed}/{len(paths)} images ({rate:.1f} images/sec)")
+    except KeyboardInterrupt:
+        print(f"\nInterrupted after {done + processed}/{len(paths)} - rerun to resume")
+        return
+    finally:
+        # Workers may still be busy after an error or Ctrl+C
+        pool.terminate()
+        pool.join()
+        # Images scored before a failure count as done
+        if pending:
+            commit()
+
+    elapsed = time.time() - start
+    print(f"Done: {processed} images in {elapsed:.1f}s ({processed / elapsed:.1f} images/sec)")
+
+
+# ============ PREPROCESSING BENCHMARK ============
+
+def bench_preprocess(source: str, app_hint: str = "", limit: Optional[int] = None):
+    """OCR stored screenshots with and without preprocessing; compare time and decisions"""
+    paths = _batch_paths(source)[:limit]
+    if not paths:
+        print(f"No images match {source}")
+        return
+    backend = get_ocr_backend()
+    settings = preprocess_settings(app_hint)
+    print(f"{len(paths)} images, OCR backend: {backend.name}, settings: {settings or 'default'}")
+
+    raw_total = prep_total = pre_ocr_total = 0.0
+    agree = 0
+    for path in paths:
+        frame = load_image(path)
+
+        started = time.perf_counter()
+        raw_type = classify_text(backend.ocr(frame), app_hint)[0]
+        raw_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        prepared = preprocess(frame, settings)
+        prep_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        pre_type = classify_text(backend.ocr(prepared), app_hint)[0]
+        pre_ocr_time = time.perf_counter() - started
+
+        same = (raw_type, should_block(raw_type)) == (pre_type, should_block(pre_type))
+        agree += same
+        raw_total += raw_time
+        prep_total += prep_time
+        pre_ocr_total += pre_ocr_time
+        print(f"{os.path.basename(path)[:40]:40} {frame.width}x{frame.height} -> "
+              f"{prepared.width}x{prepared.height}  raw {raw_time * 1000:6.0f}ms  "
+              f"pre {prep_time * 1000:4.0f}+{pre_ocr_time * 1000:6.0f}ms  "
+              f"{raw_type.value:>8} {'==' if same else '!='} {pre_type.value}")
+
+    n = len(paths)
+    print("-" * 50)
+    print(f"Raw OCR:         {raw_total / n * 1000:.0f}ms/image")
+    print(f"Preprocessed:    {(prep_total + pre_ocr_total) / n * 1000:.0f}ms/image "
+          f"({prep_total / n * 1000:.0f}ms preprocessing)")
+    print(f"Same decision:   {agree}/{n} ({agree / n:.0%})")
+
+
+# ============ TILED OCR BENCHMARK ============
+
+def bench_tiles(source: str, tile_size: int = OCR_TILE_SIZE, workers: Optional[int] = None,
+                limit: Optional[int] = None):
+    """OCR stored screenshots whole and as parallel tiles; compare throughput and text"""
+    global _tile_cache
+    paths = _batch_paths(source)[:limit]
+    if not paths:
+        print(f"No images match {source}")
+        return
+    backend = get_ocr_backend()
+    workers = workers or tile_workers()
+    pool_size = None
+    if isinstance(backend, TesseractPool):
+        backend.grow(workers)
+        pool_size = len(backend._workers)
+    print(f"{len(paths)} images, OCR backend: {backend.name}"
+          f"{f' ({pool_size} workers)' if pool_size else ''}, "
+          f"tiles {tile_size}px, {workers} at once")
+    if not backend.concurrent:
+        print("Backend can't OCR tiles concurrently - tiles run one at a time")
+    _tile_cache = TileCache()
+
+    whole_total = tiled_total = unchanged_total = 0.0
+    pixels = 0
+    similar = 0.0
+    for path in paths:
+        frame = prepare_for_ocr(load_image(path))
+        pixels += frame.width * frame.height
+
+        started = time.perf_counter()
+        whole_text = words_to_text(parse_tsv(backend.ocr_tsv(frame)))
+        whole_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        tiled_text = ocr_tiled(frame, tile_size, workers)
+        tiled_time = time.perf_counter() - started
+
+        # Same frame again: every tile is unchanged
+        started = time.perf_counter()
+        ocr_tiled(frame, tile_size, workers)
+        unchanged_time = time.perf_counter() - started
+
+        score = similarity(minhash(whole_text), minhash(tiled_text))
+        similar += score
+        whole_total += whole_time
+        tiled_total += tiled_time
+        unchanged_total += unchanged_time
+        tiles = len(tile_grid(frame.width, frame.height, tile_size))
+        print(f"{os.path.basename(path)[:40]:40} {frame.width}x{frame.height} {tiles:3} tiles  "
+              f"whole {whole_time * 1000:6.0f}ms  tiled {tiled_time * 1000:6.0f}ms  "
+              f"unchanged {unchanged_time * 1000:4.0f}ms  text {score:.0%}")
+
+    n = len(paths)
+    megapixels = pixels / 1e6
+    print("-" * 50)
+    print(f"Whole frame:     {whole_total / n * 1000:.0f}ms/image, {megapixels / whole_total:.1f} Mpx/s")
+    print(f"Tiled:           {tiled_total / n * 1000:.0f}ms/image, {megapixels / tiled_total:.1f} Mpx/s "
+          f"({whole_total / tiled_total:.1f}x)")
+    print(f"Unchanged tiles: {unchanged_total / n * 1000:.0f}ms/image")
+    print(f"Text similarity: {similar / n:.0%} (shingle Jaccard, tiled vs whole)")
+
+
+def _option(name: str) -> Optional[str]:
+    """Value following `name` on the command line, if present"""
+    if name in sys.argv:
+        i = sys.argv.index(name)
+        if i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+    return None
 
 
 def main():
@@ -626,17 +2881,77 @@ def main():
     arg = sys.argv[1]
 
     if arg == "--monitor":
-        interval = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
-        monitor_mode(interval)
+        has_interval = len(sys.argv) > 2 and not sys.argv[2].startswith("--")
+        interval = float(sys.argv[2]) if has_interval else 2.0
+        budget = _option("--cpu-budget")
+        monitor_mode(interval, float(budget) if budget else MONITOR_CPU_BUDGET)
+
+    elif arg == "--learn":
+        try:
+            show_learned(learn_from_history(rebuild="--rebuild" in sys.argv))
+        except ImportError:
+            print("numpy is required for --learn (pip install numpy)")
 
     elif arg == "--stats":
         show_stats()
 
+    elif arg == "--rebuild-stats":
+        get_history_store().rebuild_stats()
+        show_stats()
+
     elif arg == "--history":
-        limit = int(sys.argv[2]) if len(sys.argv) > 2 else 20
-        for entry in load_history(limit):
-            print(f"{entry['timestamp'][:19]} | {entry.get('app_hint', ''):12} | "
-                  f"{entry['screen_type']:12} | {'BLOCK' if entry['should_block'] else 'allow'}")
+        has_limit = len(sys.argv) > 2 and not sys.argv[2].startswith("--")
+        limit = int(sys.argv[2]) if has_limit else 20
+        app, since, until = _option("--app"), _option("--since"), _option("--until")
+
+        if since or until:
+            entries = query_history(since, until, app, limit if has_limit else None)
+        else:
+            entries = load_history(limit, app)
+
+        for entry in entries:
+            label = f" (labeled {entry['label']})" if entry.get('label') else ""
+            print(f"{entry['id']:>7} | {entry['timestamp'][:19]} | {entry.get('app_hint', ''):12} | "
+                  f"{entry['screen_type']:12} | {'BLOCK' if entry['should_block'] else 'allow'}{label}")
+
+    elif arg == "--label":
+        types = [t.value for t in ScreenType]
+        if len(sys.argv) < 4 or sys.argv[3] not in types:
+            print(f"Usage: screen_analyzer.py --label ROW_ID TYPE  (TYPE: {', '.join(types)})")
+            return
+        row_id, label = int(sys.argv[2]), sys.argv[3]
+        flush_history()
+        if get_history_store().set_label(row_id, label):
+            print(f"Row {row_id} labeled {label} - run --learn to train on it")
+        else:
+            print(f"No history row {row_id}")
+
+    elif arg == "--batch":
+        if len(sys.argv) < 3:
+            print("Usage: screen_analyzer.py --batch <dir|glob> [--app APP] [--workers N]")
+            return
+        workers = _option("--workers")
+        batch_mode(sys.argv[2], _option("--app") or "", int(workers) if workers else None)
+
+    elif arg == "--bench-preprocess":
+        if len(sys.argv) < 3:
+            print("Usage: screen_analyzer.py --bench-preprocess <dir|glob> [--app APP] [--limit N]")
+            return
+        limit = _option("--limit")
+        bench_preprocess(sys.argv[2], _option("--app") or "", int(limit) if limit else None)
+
+    elif arg == "--bench-tiles":
+        if len(sys.argv) < 3:
+            print("Usage: screen_analyzer.py --bench-tiles <dir|glob> [--tile-size PX] [--workers N] [--limit N]")
+            return
+        size, workers, limit = _option("--tile-size"), _option("--workers"), _option("--limit")
+        bench_tiles(sys.argv[2], int(size) if size else OCR_TILE_SIZE,
+                    int(workers) if workers else None, int(limit) if limit else None)
+
+    elif arg == "--import-history":
+        path = Path(sys.argv[2]) if len(sys.argv) > 2 else SCREENS_DB
+        count = get_history_store().import_jsonl(path)
+        print(f"Imported {count} rows from {path}")
 
     elif arg == "--test":
         # Test with sample text
@@ -0,0 +1,326 @@
+"""
+TotalControl Screen Capture
+
+Grabs the screen straight into memory so frames can go to OCR without a
+PNG encode/decode round trip or a file on disk.
+
+Backends (first one available wins):
+1. mss - X11 shared memory (XShmGetImage) where the server supports it
+2. python-xlib - plain XGetImage over a persistent connection
+
+When neither is installed, screen_analyzer falls back to the screenshot
+CLI tools (gnome-screenshot, scrot, ...) which write a PNG file.
+"""
+
+import struct
+import sys
+import zlib
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# (left, top, width, height) in root window coordinates
+Region = Tuple[int, int, int, int]
+
+_BYTES_PER_PIXEL = {'L': 1, 'RGB': 3, 'BGRA': 4}
+
+
+@dataclass
+class Frame:
+    """Raw pixels of a captured screen area"""
+    width: int
+    height: int
+    mode: str  # 'L', 'RGB' or 'BGRA' (X11 ZPixmap order)
+    data: bytes
+    left: int = 0
+    top: int = 0
+    scale: int = 1  # Screen pixels per frame pixel, > 1 once downscaled
+
+    @property
+    def bytes_per_pixel(self) -> int:
+        return _BYTES_PER_PIXEL[self.mode]
+
+    def to_rgb(self) -> 'Frame':
+        """Drop alpha and swap to RGB order (what tesseract expects)"""
+        if self.mode != 'BGRA':
+            return self
+        rgb = bytearray(self.width * self.height * 3)
+        rgb[0::3] = self.data[2::4]
+        rgb[1::3] = self.data[1::4]
+        rgb[2::3] = self.data[0::4]
+        return Frame(self.width, self.height, 'RGB', bytes(rgb), self.left, self.top, self.scale)
+
+    def downscale(self, factor: int) -> 'Frame':
+        """Keep every `factor`-th pixel in each direction (nearest neighbour)"""
+        if factor <= 1:
+            return self
+        width, height = self.width // factor, self.height // factor
+        bpp = self.bytes_per_pixel
+        stride = self.width * bpp
+        span = width * factor * bpp  # Source bytes covering the kept columns
+
+        out = bytearray()
+        for y in range(0, height * factor, factor):
+            row = memoryview(self.data)[y * stride:y * stride + span]
+            if bpp == 4:
+                out += row.cast('I')[::factor].tobytes()
+            elif bpp == 1:
+                out += row[::factor].tobytes()
+            else:
+                pixels = bytearray(width * 3)
+                for channel in range(3):
+                    pixels[channel::3] = row[channel::3 * factor]
+                out += pixels
+        return Frame(width, height, self.mode, bytes(out), self.left, self.top, self.scale * factor)
+
+    def crop(self, region: Region) -> 'Frame':
+        """Sub-frame for (left, top, width, height), relative to this frame"""
+        left, top, width, height = region
+        left, top = max(0, left), max(0, top)
+        width = min(width, self.width - left)
+        height = min(height, self.height - top)
+        bpp = self.bytes_per_pixel
+        stride = self.width * bpp
+        if left == 0 and width == self.width:
+            data = self.data[top * stride:(top + height) * stride]
+        else:
+            data = b''.join(self.data[y * stride + left * bpp:y * stride + (left + width) * bpp]
+                            for y in range(top, top + height))
+        return Frame(width, height, self.mode, data,
+                     self.left + left * self.scale, self.top + top * self.scale, self.scale)
+
+    def to_pnm(self) -> bytes:
+        """Uncompressed PGM/PPM - cheap to build, readable by tesseract on stdin"""
+        frame = self.to_rgb()
+        magic = b'P5' if frame.mode == 'L' else b'P6'
+        return magic + f"\n{frame.width} {frame.height}\n255\n".encode() + frame.data
+
+    def save_png(self, path: str, level: int = 3):
+        """Encode as PNG. Only used for frames that are kept."""
+        frame = self.to_rgb()
+        stride = frame.width * frame.bytes_per_pixel
+        color_type = 0 if frame.mode == 'L' else 2
+
+        raw = bytearray()
+        for y in range(frame.height):
+            raw.append(0)  # filter: none
+            raw += frame.data[y * stride:(y + 1) * stride]
+
+        def chunk(tag: bytes, body: bytes) -> bytes:
+            return (struct.pack('>I', len(body)) + tag + body +
+                    struct.pack('>I', zlib.crc32(tag + body) & 0xffffffff))
+
+        header = struct.pack('>IIBBBBB', frame.width, frame.height, 8, color_type, 0, 0, 0)
+        with open(path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+            f.write(chunk(b'IHDR', header))
+            f.write(chunk(b'IDAT', zlib.compress(bytes(raw), level)))
+            f.write(chunk(b'IEND', b''))
+
+
+def _unfilter_png(raw: bytes, width: int, height: int, bpp: int) -> bytes:
+    """Undo PNG per-row filters (None, Sub, Up, Average, Paeth)"""
+    stride = width * bpp
+    out = bytearray(height * stride)
+    prev = bytearray(stride)
+    pos = 0
+    for y in range(height):
+        kind = raw[pos]
+        row = bytearray(raw[pos + 1:pos + 1 + stride])
+        pos += 1 + stride
+        if kind == 1:
+            for i in range(bpp, stride):
+                row[i] = (row[i] + row[i - bpp]) & 0xff
+        elif kind == 2:
+            row = bytearray((a + b) & 0xff for a, b in zip(row, prev))
+        elif kind == 3:
+            for i in range(stride):
+                left = row[i - bpp] if i >= bpp else 0
+                row[i] = (row[i] + ((left + prev[i]) >> 1)) & 0xff
+        elif kind == 4:
+            for i in range(stride):
+                a = row[i - bpp] if i >= bpp else 0
+                b = prev[i]
+                c = prev[i - bpp] if i >= bpp else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                row[i] = (row[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xff
+        out[y * stride:(y + 1) * stride] = row
+        prev = row
+    return bytes(out)
+
+
+def load_image(path: str) -> Frame:
+    """
+    Read a saved screenshot into a Frame. Uses Pillow when installed;
+    otherwise decodes 8-bit non-interlaced gray/RGB/RGBA PNGs itself
+    (slow for filtered rows, fine for the files save_png writes).
+    """
+    try:
+        from PIL import Image as PILImage
+    except ImportError:
+        pass
+    else:
+        with PILImage.open(path) as im:
+            im = im.convert('L' if im.mode in ('1', 'L', 'LA', 'I', 'F') else 'RGB')
+            return Frame(im.width, im.height, im.mode, im.tobytes())
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError(f"{path}: not a PNG (install Pillow for other formats)")
+
+    pos, idat, header = 8, [], None
+    while pos < len(data):
+        length, tag = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if tag == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif tag == b'IDAT':
+            idat.append(body)
+        elif tag == b'IEND':
+            break
+        pos += 12 + length
+
+    width, height, depth, color_type, _, _, interlace = header
+    channels = {0: 1, 2: 3, 6: 4}.get(color_type)
+    if depth != 8 or interlace or channels is None:
+        raise ValueError(f"{path}: unsupported PNG (install Pillow)")
+    pixels = _unfilter_png(zlib.decompress(b''.join(idat)), width, height, channels)
+
+    if channels == 4:
+        rgb = bytearray(width * height * 3)
+        for c in range(3):
+            rgb[c::3] = pixels[c::4]
+        return Frame(width, height, 'RGB', bytes(rgb))
+    return Frame(width, height, 'L' if channels == 1 else 'RGB', pixels)
+
+
+def frame_fingerprint(frame: Frame, hash_size: int = 16, samples: int = 3) -> int:
+    """
+    Difference hash (dHash) of the frame: shrink to (hash_size+1) x hash_size
+    grayscale cells by averaging a few sampled pixels per cell, then set one
+    bit per horizontally adjacent pair (left brighter than right). Nearly
+    identical screens give hashes a few bits apart.
+    """
+    if frame.width == 0 or frame.height == 0:
+        return 0
+
+    bpp = frame.bytes_per_pixel
+    stride = frame.width * bpp
+    data = frame.data
+    # Byte offsets of R, G, B within a pixel
+    red, green, blue = (2, 1, 0) if frame.mode == 'BGRA' else (0, 1, 2)
+
+    cols, rows = hash_size + 1, hash_size
+    xs = [(2 * i + 1) * frame.width // (2 * cols * samples) for i in range(cols * samples)]
+    ys = [(2 * i + 1) * frame.height // (2 * rows * samples) for i in range(rows * samples)]
+
+    cells = []
+    for row in range(rows):
+        row_offsets = [y * stride for y in ys[row * samples:(row + 1) * samples]]
+        for col in range(cols):
+            total = 0
+            for x in xs[col * samples:(col + 1) * samples]:
+                for offset in row_offsets:
+                    i = offset + x * bpp
+                    if bpp == 1:
+                        total += data[i]
+                    else:
+                        # ~0.25 R + 0.625 G + 0.125 B
+                        total += 2 * data[i + red] + 5 * data[i + green] + data[i + blue]
+            cells.append(total)
+
+    bits = 0
+    for row in range(rows):
+        base = row * cols
+        for col in range(hash_size):
+            bits = (bits << 1) | (cells[base + col] > cells[base + col + 1])
+    return bits
+
+
+def clip_region(region: Region, bounds: Region) -> Optional[Region]:
+    """Intersection of two (left, top, width, height) rectangles, None if empty"""
+    left, top = max(region[0], bounds[0]), max(region[1], bounds[1])
+    right = min(region[0] + region[2], bounds[0] + bounds[2])
+    bottom = min(region[1] + region[3], bounds[1] + bounds[3])
+    if right <= left or bottom <= top:
+        return None
+    return (left, top, right - left, bottom - top)
+
+
+class CaptureBackend:
+    """
+    Grabs a screen region into a Frame. Not thread-safe - use from one thread.
+    Regions partly off screen are clipped; regions fully off screen grab everything.
+    """
+    name = "base"
+
+    def grab(self, region: Optional[Region] = None) -> Frame:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MSSCapture(CaptureBackend):
+    name = "mss"
+
+    def __init__(self):
+        import mss
+        self._sct = mss.mss()
+
+    def grab(self, region: Optional[Region] = None) -> Frame:
+        screen = self._sct.monitors[0]  # Union of all monitors
+        if region is not None:
+            region = clip_region(region, (screen['left'], screen['top'], screen['width'], screen['height']))
+        if region is None:
+            monitor = screen
+        else:
+            left, top, width, height = region
+            monitor = {'left': left, 'top': top, 'width': width, 'height': height}
+        shot = self._sct.grab(monitor)
+        return Frame(shot.width, shot.height, 'BGRA', bytes(shot.raw),
+                     monitor['left'], monitor['top'])
+
+    def close(self):
+        self._sct.close()
+
+
+class XlibCapture(CaptureBackend):
+    name = "xlib"
+
+    def __init__(self):
+        from Xlib import display, X
+        self._X = X
+        self._display = display.Display()
+        self._root = self._display.screen().root
+
+    def grab(self, region: Optional[Region] = None) -> Frame:
+        geometry = self._root.get_geometry()
+        screen = (0, 0, geometry.width, geometry.height)
+        region = clip_region(region, screen) if region is not None else None
+        left, top, width, height = region or screen
+        image = self._root.get_image(left, top, width, height, self._X.ZPixmap, 0xffffffff)
+        return Frame(width, height, 'BGRA', image.data, left, top)
+
+    def close(self):
+        self._display.close()
+
+
+_backend = None
+_backend_checked = False
+
+def get_capture_backend() -> Optional[CaptureBackend]:
+    """Return the in-memory capture backend, or None if none is usable"""
+    global _backend, _backend_checked
+    if not _backend_checked:
+        _backend_checked = True
+        for backend_class in (MSSCapture, XlibCapture):
+            try:
+                _backend = backend_class()
+                break
+            except ImportError:
+                continue
+            except Exception as e:
+                print(f"[Capture] {backend_class.name} unavailable: {e}", file=sys.stderr)
+    return _backend
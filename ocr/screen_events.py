@@ -0,0 +1,165 @@
+"""
+TotalControl Screen Events
+
+Tells the monitor when the screen actually changed, instead of it polling
+on a timer:
+- DAMAGE extension on the root window: rectangles that were redrawn
+- PropertyNotify on the root (_NET_ACTIVE_WINDOW) and on the focused window
+  (_NET_WM_NAME / WM_NAME): focus and title changes
+
+Events are read on a background thread. Dirty rectangles are merged and
+handed over with take_dirty(); every change also invokes the callback with
+'damage' or 'focus'. Needs python-xlib; without it (or without DAMAGE) the
+monitor keeps polling. Some compositing window managers redraw through an
+overlay window and report little root damage - the monitor's safety poll
+covers that.
+"""
+
+import select
+import sys
+import threading
+from typing import Callable, List, Optional
+
+from screen_capture import Region, clip_region
+
+MAX_DIRTY_RECTS = 32  # Beyond this, dirty rectangles collapse into one bounding box
+
+
+def _touching(a: Region, b: Region) -> bool:
+    return (a[0] <= b[0] + b[2] and b[0] <= a[0] + a[2] and
+            a[1] <= b[1] + b[3] and b[1] <= a[1] + a[3])
+
+
+def _union(a: Region, b: Region) -> Region:
+    left, top = min(a[0], b[0]), min(a[1], b[1])
+    right, bottom = max(a[0] + a[2], b[0] + b[2]), max(a[1] + a[3], b[1] + b[3])
+    return (left, top, right - left, bottom - top)
+
+
+def merge_rect(rects: List[Region], rect: Region) -> List[Region]:
+    """Add rect, merging it with every rectangle it touches"""
+    merged = True
+    while merged:
+        merged = False
+        for i, other in enumerate(rects):
+            if _touching(rect, other):
+                rect = _union(rect, rects.pop(i))
+                merged = True
+                break
+    rects.append(rect)
+    if len(rects) > MAX_DIRTY_RECTS:
+        box = rects[0]
+        for other in rects[1:]:
+            box = _union(box, other)
+        rects[:] = [box]
+    return rects
+
+
+class ScreenEvents:
+    """Background X11 event reader"""
+
+    def __init__(self, on_change: Callable[[str], None]):
+        from Xlib import X, display
+        from Xlib.ext import damage
+
+        self._X = X
+        self._display = display.Display()
+        if not self._display.has_extension('DAMAGE'):
+            self._display.close()
+            raise RuntimeError("X server has no DAMAGE extension")
+        self._display.damage_query_version()
+
+        self._root = self._display.screen().root
+        self._atoms = {name: self._display.intern_atom(name)
+                       for name in ('_NET_ACTIVE_WINDOW', '_NET_WM_NAME', 'WM_NAME')}
+        self._on_change = on_change
+        self._lock = threading.Lock()
+        self._dirty: List[Region] = []
+        self._focused = None
+        self._running = False
+        self.events = 0
+
+        self._root.change_attributes(event_mask=X.PropertyChangeMask)
+        self._damage_id = self._root.damage_create(damage.DamageReportBoundingBox)
+        self._watch_focused()
+        self._display.flush()
+
+    def _watch_focused(self):
+        """Follow title changes of the currently focused window"""
+        try:
+            prop = self._root.get_full_property(self._atoms['_NET_ACTIVE_WINDOW'], self._X.AnyPropertyType)
+            if not prop or not prop.value:
+                return
+            window = self._display.create_resource_object('window', prop.value[0])
+            window.change_attributes(event_mask=self._X.PropertyChangeMask)
+            self._focused = window
+        except Exception:
+            self._focused = None  # Window vanished between the two requests
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._loop, daemon=True, name="screen-events").start()
+
+    def stop(self):
+        self._running = False
+
+    def take_dirty(self) -> List[Region]:
+        """Merged rectangles redrawn since the last call"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, []
+        return dirty
+
+    def dirty_intersects(self, region: Region) -> bool:
+        with self._lock:
+            return any(clip_region(rect, region) for rect in self._dirty)
+
+    def _loop(self):
+        fd = self._display.fileno()
+        while self._running:
+            try:
+                if not self._display.pending_events():
+                    select.select([fd], [], [], 0.5)
+                while self._display.pending_events():
+                    self._handle(self._display.next_event())
+            except Exception as e:
+                print(f"[Events] {e}", file=sys.stderr)
+                self._running = False
+        self._display.close()
+
+    def _handle(self, event):
+        self.events += 1
+        if event.type == self._display.extension_event.DamageNotify:
+            area = event.area
+            with self._lock:
+                merge_rect(self._dirty, (area.x, area.y, area.width, area.height))
+            # Acknowledge, or the server stops reporting this damage object
+            self._display.damage_subtract(self._damage_id)
+            self._display.flush()
+            self._on_change('damage')
+
+        elif event.type == self._X.PropertyNotify:
+            if event.atom == self._atoms['_NET_ACTIVE_WINDOW']:
+                self._watch_focused()
+                self._display.flush()
+                self._on_change('focus')
+            elif event.atom in (self._atoms['_NET_WM_NAME'], self._atoms['WM_NAME']):
+                self._on_change('focus')
+
+
+_events = None
+_events_checked = False
+
+def get_screen_events(on_change: Callable[[str], None]) -> Optional[ScreenEvents]:
+    """Start the event reader, or return None if X11 events aren't available"""
+    global _events, _events_checked
+    if not _events_checked:
+        _events_checked = True
+        try:
+            _events = ScreenEvents(on_change)
+        except ImportError:
+            pass
+        except Exception as e:
+            print(f"[Events] Unavailable, polling instead: {e}", file=sys.stderr)
+    return _events
@@ -0,0 +1,198 @@
+"""
+TotalControl Screenshot Store
+
+Kept screenshots (blocked screens) stored by content: the file name is a hash
+of the pixels, so a screen that is blocked again and again is stored once.
+Frames are written as lossless WebP when Pillow has WebP support, as PNG
+otherwise.
+
+A background collector keeps the directory within a size quota and drops
+objects older than the age limit, least recently stored first. Storing an
+object that already exists refreshes its age. Files from before the store
+(timestamp-named PNGs in the same directory) are collected the same way.
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+from screen_capture import Frame
+
+MAX_BYTES = 2 * 1024 ** 3    # Size quota for the whole directory
+MAX_AGE_DAYS = 30
+GC_INTERVAL = 600.0          # Seconds between collections
+GC_SLACK = 0.1               # Collect early once this share of the quota was added since the last run
+PNG_LEVEL = 6
+
+
+def frame_digest(frame: Frame) -> str:
+    """Content address of a frame: hash of its size, pixel format and pixels"""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{frame.width}x{frame.height}:{frame.mode}:".encode())
+    digest.update(frame.data)
+    return digest.hexdigest()
+
+
+def _encode_webp(frame: Frame, path: str) -> bool:
+    """Write frame as lossless WebP; False if Pillow (with WebP) isn't available"""
+    try:
+        from PIL import Image as PILImage
+    except ImportError:
+        return False
+    frame = frame.to_rgb()
+    try:
+        image = PILImage.frombuffer(frame.mode, (frame.width, frame.height), frame.data, 'raw', frame.mode, 0, 1)
+        image.save(path, 'WEBP', lossless=True, method=4)
+        return True
+    except (OSError, KeyError, ValueError):
+        return False
+
+
+class ScreenshotStore:
+    """Content-addressed screenshot files under root/objects/<2 hex>/<hash>.<ext>"""
+
+    def __init__(self, root: Path, max_bytes: int = MAX_BYTES, max_age_days: float = MAX_AGE_DAYS,
+                 gc_interval: float = GC_INTERVAL):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.gc_interval = gc_interval
+        self.stored = 0
+        self.deduplicated = 0
+        self.collected = 0
+        self._added_bytes = 0  # Since the last collection
+        self._webp = None      # Unknown until the first frame is encoded
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+
+    def _existing(self, digest: str) -> Optional[Path]:
+        for ext in ('.webp', '.png'):
+            path = self.objects / digest[:2] / (digest + ext)
+            try:
+                os.utime(path)  # Refresh its age
+                return path
+            except FileNotFoundError:
+                continue
+        return None
+
+    def _added(self, path: Path, deduplicated: bool) -> str:
+        with self._lock:
+            if deduplicated:
+                self.deduplicated += 1
+            else:
+                self.stored += 1
+                self._added_bytes += path.stat().st_size
+                if self._added_bytes > self.max_bytes * GC_SLACK:
+                    self._wake.set()
+        return str(path)
+
+    def put_frame(self, frame: Frame) -> str:
+        """Store a frame (once per distinct content); returns its path"""
+        digest = frame_digest(frame)
+        existing = self._existing(digest)
+        if existing is not None:
+            return self._added(existing, True)
+
+        directory = self.objects / digest[:2]
+        directory.mkdir(exist_ok=True)
+        tmp_path = directory / f".{digest}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if self._webp is not False:
+            self._webp = _encode_webp(frame, str(tmp_path))
+        if self._webp:
+            path = directory / (digest + '.webp')
+        else:
+            frame.save_png(str(tmp_path), PNG_LEVEL)
+            path = directory / (digest + '.png')
+        os.replace(tmp_path, path)
+        return self._added(path, False)
+
+    def put_file(self, source: str) -> str:
+        """Move an image file (screenshot tool output) into the store; returns its new path"""
+        digest = hashlib.blake2b(digest_size=20)
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        ext = Path(source).suffix.lower() or '.png'
+        path = self.objects / digest[:2] / (digest + ext)
+        try:
+            os.utime(path)
+            os.remove(source)
+            return self._added(path, True)
+        except FileNotFoundError:
+            pass
+        path.parent.mkdir(exist_ok=True)
+        shutil.move(source, path)
+        return self._added(path, False)
+
+    def _files(self):
+        """(mtime, size, path) of every stored file, including pre-store screenshots"""
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def usage(self) -> Tuple[int, int]:
+        """(files, bytes) currently stored"""
+        files = total = 0
+        for _, size, _ in self._files():
+            files += 1
+            total += size
+        return files, total
+
+    def collect(self) -> Tuple[int, int]:
+        """Delete files past the age limit, then the oldest until under the quota; returns (files, bytes) freed"""
+        with self._lock:
+            self._added_bytes = 0
+        entries = sorted(self._files())
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.max_age
+        removed = freed = 0
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            freed += size
+        self.collected += removed
+        return removed, freed
+
+    def start(self):
+        """Collect in a background thread, every gc_interval and when the quota fills up"""
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._gc_loop, daemon=True, name="screenshot-gc").start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def _gc_loop(self):
+        while self._running:
+            try:
+                removed, freed = self.collect()
+                if removed:
+                    print(f"[Screenshots] Removed {removed} files ({freed / 1e6:.1f} MB)", file=sys.stderr)
+            except OSError as e:
+                print(f"[Screenshots] Collection failed: {e}", file=sys.stderr)
+            self._wake.wait(self.gc_interval)
+            self._wake.clear()
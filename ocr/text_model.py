@@ -0,0 +1,180 @@
+"""
+TotalControl Text Model
+
+Multinomial naive Bayes over OCR tokens, learned from the analysis history.
+
+Features are lowercase word unigrams and bigrams plus whatever extra tokens
+the caller adds (screen_analyzer adds the app hint and the regex rules that
+fired, so the hand-written patterns become features). Counts live in a
+NumPy matrix (classes x vocabulary); scoring a frame is one gather and dot
+product over the frame's feature columns.
+
+Training is incremental: `update()` only adds counts, so new history rows
+can be folded in without revisiting old ones. Examples carry a weight, so a
+hand-labeled row can count for more than a guessed one. The model is saved as JSON
+(vocabulary plus sparse counts) so it stays inspectable.
+"""
+
+import json
+import math
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MODEL_VERSION = 1
+MAX_FEATURES = 50000  # New tokens beyond this are ignored
+SMOOTHING = 0.5       # Additive (Lidstone) smoothing
+
+_TOKEN_RE = re.compile(r"[a-z0-9@#']+")
+
+
+def text_features(text: str, extra: Iterable[str] = ()) -> List[str]:
+    """Unigrams and bigrams of the lowercased text, followed by `extra`"""
+    words = _TOKEN_RE.findall(text.lower())
+    features = list(words)
+    features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    features += extra
+    return features
+
+
+class TextModel:
+    """Naive Bayes text classifier with a growable vocabulary"""
+
+    def __init__(self, classes: List[str]):
+        import numpy as np
+        self._np = np
+        self.classes = list(classes)
+        self.vocabulary: Dict[str, int] = {}
+        self.tokens: List[str] = []
+        self.counts = np.zeros((len(self.classes), 0))
+        self.class_docs = np.zeros(len(self.classes))
+        self.rows = 0
+        self.trained_through = 0  # Last history row id folded in
+        self.labels_through = 0   # Last history label id folded in
+        self._weights = None      # Cached log P(token | class), rebuilt on update
+
+    # === training ===
+
+    def update(self, examples: Iterable[Tuple[List[str], str, int]]) -> int:
+        """Add (features, label, weight) examples; returns how many were used"""
+        np = self._np
+        class_index = {c: i for i, c in enumerate(self.classes)}
+        rows, cols, weights = [], [], []
+        used = 0
+
+        for features, label, weight in examples:
+            c = class_index.get(label)
+            if c is None:
+                continue
+            for feature in features:
+                j = self.vocabulary.get(feature)
+                if j is None:
+                    if len(self.tokens) >= MAX_FEATURES:
+                        continue
+                    j = self.vocabulary[feature] = len(self.tokens)
+                    self.tokens.append(feature)
+                rows.append(c)
+                cols.append(j)
+                weights.append(weight)
+            self.class_docs[c] += weight
+            used += 1
+
+        if len(self.tokens) > self.counts.shape[1]:
+            grow = len(self.tokens) - self.counts.shape[1]
+            self.counts = np.pad(self.counts, ((0, 0), (0, grow)))
+        if rows:
+            np.add.at(self.counts, (np.array(rows), np.array(cols)), np.array(weights))
+        self.rows += used
+        self._weights = None
+        return used
+
+    # === scoring ===
+
+    def _log_weights(self):
+        if self._weights is None:
+            np = self._np
+            smoothed = self.counts + SMOOTHING
+            self._weights = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+            self._log_prior = np.log((self.class_docs + 1) / (self.class_docs.sum() + len(self.classes)))
+        return self._weights
+
+    def predict(self, features: List[str]) -> Tuple[str, float]:
+        """Most likely class and its posterior probability"""
+        np = self._np
+        weights = self._log_weights()
+
+        index = [self.vocabulary[f] for f in features if f in self.vocabulary]
+        if not index:
+            return self.classes[int(np.argmax(self._log_prior))], 0.0
+        columns, counts = np.unique(index, return_counts=True)
+        scores = self._log_prior + weights[:, columns] @ counts
+
+        probs = np.exp(scores - scores.max())
+        probs /= probs.sum()
+        best = int(np.argmax(probs))
+        return self.classes[best], float(probs[best])
+
+    def top_features(self, label: str, n: int = 10, min_count: int = 3) -> List[Tuple[str, float]]:
+        """Tokens that most favour `label` over the other classes (log-odds)"""
+        np = self._np
+        c = self.classes.index(label)
+        weights = self._log_weights()
+        if weights.shape[1] == 0:
+            return []
+        others = np.delete(weights, c, axis=0)
+        lift = weights[c] - (others.max(axis=0) if len(others) else 0)
+        lift[self.counts[c] < min_count] = -np.inf
+        best = np.argsort(lift)[::-1][:n]
+        return [(self.tokens[j], float(lift[j])) for j in best if math.isfinite(lift[j])]
+
+    # === persistence ===
+
+    def to_dict(self) -> dict:
+        np = self._np
+        return {
+            'version': MODEL_VERSION,
+            'classes': self.classes,
+            'rows': self.rows,
+            'trained_through': self.trained_through,
+            'labels_through': self.labels_through,
+            'class_docs': self.class_docs.astype(int).tolist(),
+            'tokens': self.tokens,
+            # Sparse: per class, [[token index, count], ...]
+            'counts': [[[int(j), int(row[j])] for j in np.flatnonzero(row)] for row in self.counts],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TextModel':
+        if data.get('version') != MODEL_VERSION:
+            raise ValueError(f"unsupported model version {data.get('version')}")
+        model = cls(data['classes'])
+        np = model._np
+        model.rows = data['rows']
+        model.trained_through = data['trained_through']
+        model.labels_through = data.get('labels_through', 0)
+        model.class_docs = np.array(data['class_docs'], dtype=float)
+        model.tokens = list(data['tokens'])
+        model.vocabulary = {token: j for j, token in enumerate(model.tokens)}
+        model.counts = np.zeros((len(model.classes), len(model.tokens)))
+        for c, row in enumerate(data['counts']):
+            for j, count in row:
+                model.counts[c, j] = count
+        return model
+
+    def save(self, path: Path):
+        """Write atomically so a crash never leaves a truncated model"""
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['TextModel']:
+        """Load a saved model, or None if there is none"""
+        try:
+            with open(path, 'r') as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,118 @@
+"""
+TotalControl Text Similarity
+
+Near-duplicate detection for OCR text. A ticking clock, a typing indicator
+or one misread glyph changes a text's MD5 but barely changes its word
+shingles, so screens are compared by the Jaccard similarity of their
+3-word shingle sets.
+
+Each text gets a MinHash signature; the share of equal signature slots
+estimates the Jaccard similarity. An LSH index (signature split into bands,
+one bucket per band) finds candidates among recent texts without comparing
+against all of them.
+"""
+
+import random
+import re
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+NUM_PERM = 64          # Signature length
+BANDS = 16             # LSH bands of NUM_PERM // BANDS rows (candidate threshold ~0.5)
+SHINGLE_WORDS = 3
+
+_MASK64 = (1 << 64) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD_RE = re.compile(r"\w+")
+
+# Multiply-shift hashes h(x) = ((a * x + b) mod 2^64) >> 32 with odd a.
+# Fixed seed: signatures must be stable across runs.
+_rng = random.Random(0x70C)
+_PERMUTATIONS = [(_rng.randrange(1 << 64) | 1, _rng.randrange(1 << 64)) for _ in range(NUM_PERM)]
+
+Signature = Tuple[int, ...]
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> Set[int]:
+    """Hashed word n-grams of the lowercased text (whole text if shorter)"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(' '.join(words).encode())} if words else set()
+    return {zlib.crc32(' '.join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}
+
+
+def minhash(text: str) -> Signature:
+    """MinHash signature of the text's shingle set"""
+    hashes = shingles(text)
+    if not hashes:
+        return (_MAX_HASH,) * NUM_PERM
+    try:
+        import numpy as np
+    except ImportError:
+        return tuple(min([((a * h + b) & _MASK64) >> 32 for h in hashes]) for a, b in _PERMUTATIONS)
+
+    # Same hashes, vectorized: uint64 arithmetic wraps mod 2^64
+    a = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)[:, None]
+    b = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)[:, None]
+    values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[None, :]
+    return tuple(int(v) for v in ((a * values + b) >> np.uint64(32)).min(axis=1))
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class NearDuplicateIndex:
+    """The last `capacity` signatures with a payload each, searchable by similarity"""
+
+    def __init__(self, threshold: float = 0.9, capacity: int = 256, bands: int = BANDS):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.bands = bands
+        self._rows = NUM_PERM // bands
+        self._entries: OrderedDict = OrderedDict()  # id -> (namespace, signature, payload)
+        self._buckets: Dict[tuple, Set[int]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _band_keys(self, namespace: str, signature: Signature):
+        for band in range(self.bands):
+            start = band * self._rows
+            yield (namespace, band, signature[start:start + self._rows])
+
+    def find(self, signature: Signature, namespace: str = "") -> Optional[Any]:
+        """Payload of the most similar entry at or above the threshold"""
+        candidates = set()
+        for key in self._band_keys(namespace, signature):
+            candidates |= self._buckets.get(key, set())
+
+        best_id, best = None, self.threshold
+        for entry_id in candidates:
+            score = similarity(signature, self._entries[entry_id][1])
+            if score >= best:
+                best_id, best = entry_id, score
+
+        if best_id is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id][2]
+
+    def add(self, signature: Signature, payload: Any, namespace: str = ""):
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (namespace, signature, payload)
+        for key in self._band_keys(namespace, signature):
+            self._buckets.setdefault(key, set()).add(entry_id)
+
+        while len(self._entries) > self.capacity:
+            old_id, (old_namespace, old_signature, _) = self._entries.popitem(last=False)
+            for key in self._band_keys(old_namespace, old_signature):
+                bucket = self._buckets[key]
+                bucket.discard(old_id)
+                if not bucket:
+                    del self._buckets[key]